@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+USER_CACHE_KEY = 'auth:user:{}'
+
+
+def get_user_cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+def get_cached_user(user_id):
+    """Return the user (with its Customer profile joined) from the cache, loading it on a miss."""
+    cache = get_user_cache()
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        User = get_user_model()
+        # Reverse one-to-one: request.user.customer is then free, or raises if there is none
+        user = User.objects.select_related('customer').filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            return None
+        cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+    return user
+
+
+def invalidate_cached_user(user_id):
+    get_user_cache().delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user and Customer profile from a
+    short-lived cache instead of querying auth_user on every request.
+    Entries are dropped on User/Customer save or delete (authentication.signals).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
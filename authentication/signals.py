@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from store.models import Customer
+from .backends import invalidate_cached_user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user(sender, instance, **kwargs):
+    # Covers profile edits, deactivation and password changes
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_customer(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
@@ -1,3 +1,59 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from store.models import Cart, Customer
+from .backends import user_cache_key
 
-# Create your tests here.
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret')
+        cls.customer = Customer.objects.create(user=cls.user, phone='555')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_user_and_customer_come_from_cache(self):
+        cold = self.count_queries('/store/Customers/me/')
+        self.assertEqual(self.count_queries('/store/Customers/me/'), cold - 1)
+        self.assertEqual(self.client.get('/store/Customers/me/').json()['phone'], '555')
+
+    def test_deactivation_invalidates_cache(self):
+        self.count_queries('/store/Customers/me/')
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.id)))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+        self.assertEqual(self.client.get('/store/Customers/me/').status_code, 401)
+
+    def test_customer_change_invalidates_cache(self):
+        self.count_queries('/store/Customers/me/')
+        Customer.objects.filter(pk=self.customer.pk).get().save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+
+    def test_cart_endpoints_use_the_cached_user(self):
+        cart = Cart.objects.create()
+        url = f'/store/carts/{cart.id}/items/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(any('auth_user' in q['sql'] for q in ctx.captured_queries))
+
+        # Tokens live for a year, so deactivation has to lock carts out too
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(f'/store/carts/{cart.id}/').status_code, 401)
+        self.assertEqual(self.client.get(url).status_code, 401)
@@ -0,0 +1,122 @@
+"""
+OpenAPI schema served from a build-time artifact.
+
+drf_yasg regenerates the whole document (every router, viewset and
+serializer) on each request to /swagger.json or ?format=openapi. Here the
+JSON is produced once, either by ``manage.py build_openapi_schema`` at
+deploy time (OPENAPI_SCHEMA_PATH) or, failing that, on the first request
+of the process, memoized on (ROOT_URLCONF, code_version()). The UI pages
+themselves are cheap; they fetch the spec from the same view.
+"""
+import hashlib
+import json
+import os
+import subprocess
+from collections import OrderedDict
+from functools import cache
+from importlib import import_module
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from drf_yasg import openapi
+from drf_yasg.codecs import yaml_sane_dump
+from drf_yasg.renderers import OpenAPIRenderer, SwaggerJSONRenderer, SwaggerYAMLRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+CODE_VERSION_KEY = 'x-code-version'
+SPEC_RENDERERS = (OpenAPIRenderer, SwaggerJSONRenderer, SwaggerYAMLRenderer)
+
+info = openapi.Info(
+    title="My API",
+    default_version='v1',
+    description="API documentation",
+)
+
+BaseSchemaView = get_schema_view(
+    info,
+    public=True,
+    permission_classes=[permissions.AllowAny],  # Change as needed
+)
+
+_documents = {}
+
+
+def code_version():
+    """settings.CODE_VERSION, or one derived from the code when it is unset."""
+    return settings.CODE_VERSION or _derived_code_version()
+
+
+@cache
+def _derived_code_version():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        # No checkout (e.g. a built image): fall back to when the URLconf changed
+        urlconf = import_module(settings.ROOT_URLCONF)
+        return f'mtime-{os.stat(urlconf.__file__).st_mtime_ns}'
+
+
+def generate_schema():
+    """Walk the URLconf and return the JSON document as bytes."""
+    # url='' leaves host/schemes out, so clients use the host serving the document
+    generator = BaseSchemaView.generator_class(info, url='')
+    # Views look at request.method while describing themselves
+    request = APIView().initialize_request(APIRequestFactory().get('/swagger.json'))
+    spec = generator.get_schema(request, public=True).as_odict()
+    spec[CODE_VERSION_KEY] = code_version()
+    return json.dumps(spec, ensure_ascii=False).encode()
+
+
+def _read_stored(path):
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        version = json.loads(content).get(CODE_VERSION_KEY)
+    except (ValueError, AttributeError):
+        # Truncated or not a JSON object; regenerate rather than fail the request
+        return None
+    # An artifact left over from another release would describe the wrong API
+    if version != code_version():
+        return None
+    return content
+
+
+def get_schema_document(fmt='json'):
+    """Return ``(content, etag)`` for the schema in ``fmt`` ('json' or 'yaml')."""
+    path = settings.OPENAPI_SCHEMA_PATH
+    try:
+        stored = (str(path), os.stat(path).st_mtime_ns)
+    except (TypeError, OSError):
+        stored = None
+    key = (stored or (settings.ROOT_URLCONF, code_version())) + (fmt,)
+    if key not in _documents:
+        content = (stored and _read_stored(path)) or generate_schema()
+        if fmt == 'yaml':
+            content = yaml_sane_dump(json.loads(content, object_pairs_hook=OrderedDict), binary=True)
+        _documents[key] = content, '"%s"' % hashlib.sha1(content).hexdigest()
+    return _documents[key]
+
+
+class SchemaView(BaseSchemaView):
+    def get(self, request, version='', format=None):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, SPEC_RENDERERS):
+            return super().get(request, version, format)
+
+        content, etag = get_schema_document('yaml' if renderer.format == 'yaml' else 'json')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['ETag'] = etag
+        # Revalidate every time: the document only changes on deploy, but clients can't know when
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -50,6 +50,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "store.media.MediaFileMiddleware",
+    "store.metrics.RequestMetricsMiddleware",
+    "store.nplusone.NPlusOneMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -93,6 +96,24 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory is fine for development and tests; point STORE_CACHE_ALIAS at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+STORE_CACHE_ALIAS = 'default'
+STORE_CACHE_TIMEOUT = 300  # seconds
+
+# Users resolved by authentication.backends.CachedJWTAuthentication
+AUTH_USER_CACHE_ALIAS = 'default'
+AUTH_USER_CACHE_TIMEOUT = 60  # seconds
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -136,13 +157,18 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.backends.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Default page size for the cursor paginators in store/pagination.py
+    'PAGE_SIZE': 20,
 }
 
+# PAGE_SIZE is used by per-view pagination classes only, not a global default
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=365),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=365),
@@ -186,3 +212,50 @@ DJOSER = {
 # Media Files (Uploaded files)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # Content-addressed, deduplicated uploads for the store ImageFields
+    'media': {
+        'BACKEND': 'store.storage.ContentAddressedStorage',
+    },
+}
+
+# Media serving (store/media.py). Set MEDIA_SENDFILE_HEADER to 'X-Accel-Redirect'
+# (nginx, with an internal location at MEDIA_ACCEL_REDIRECT_PREFIX) or 'X-Sendfile'
+# (Apache/lighttpd) to let the front server stream files.
+MEDIA_SENDFILE_HEADER = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365  # content-addressed uploads never change
+MEDIA_MUTABLE_CACHE_MAX_AGE = 300  # variants and legacy uploads, revalidated by ETag
+
+# Threads used to build resized image derivatives (store/images.py)
+STORE_IMAGE_WORKERS = 2
+
+# Release identifier; keys the in-process OpenAPI schema and is stamped into
+# the artifact written by `manage.py build_openapi_schema` (core/schema.py).
+# Unset, it is derived from the code: the git commit, else the URLconf's mtime.
+CODE_VERSION = os.environ.get('CODE_VERSION')
+OPENAPI_SCHEMA_PATH = os.path.join(BASE_DIR, 'openapi.json')
+
+# Per-route request metrics (store/metrics.py), scraped from /store/metrics/.
+# Requests slower than METRICS_SLOW_REQUEST_SECONDS are logged; a
+# METRICS_PROFILE_SAMPLE_RATE share of them also gets a sampled stack profile.
+METRICS_ENABLED = True
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+METRICS_PROFILE_SAMPLE_RATE = 0.01
+METRICS_PROFILE_INTERVAL = 0.005  # seconds between stack samples
+
+# N+1 detection (store/nplusone.py): 'raise' fails the request, 'log' warns,
+# None disables it. The test runner switches it to 'raise' for the suite.
+NPLUSONE_MODE = 'log' if DEBUG else None
+NPLUSONE_THRESHOLD = 5  # repetitions of one SELECT pattern within a request
+TEST_RUNNER = 'store.nplusone.NPlusOneTestRunner'
+
+# Carts with no item writes for this long are deleted by reap_abandoned_carts
+CART_TTL_DAYS = 30
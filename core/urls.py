@@ -17,21 +17,9 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path,include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from django.conf import settings
-from django.conf.urls.static import static
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="My API",
-        default_version='v1',
-        description="API documentation",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],  # Change as needed
-)
+from store.media import serve_media
+from .schema import SchemaView as schema_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -39,14 +27,14 @@ urlpatterns = [
     path('auth/', include('djoser.urls.jwt')),
     path('auth/', include('authentication.urls')),  # Add authentication URLs
 
-    #Swagger documentation
+    #Swagger documentation (spec served from core.schema, see build_openapi_schema)
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('swagger.json', schema_view.without_ui(cache_timeout=0), name='schema-json'),
 
     #store
-    path('store/', include('store.urls'))
-]
+    path('store/', include('store.urls')),
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Media (also short-circuited by store.media.MediaFileMiddleware)
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+]
\ No newline at end of file
@@ -14,7 +14,7 @@ class AuthorAdmin(admin.ModelAdmin):
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'genre', 'price', 'stock', 'created_at')
+    list_display = ('title', 'author', 'genre', 'price', 'stock', 'average_rating', 'created_at')
     list_filter = ('genre', 'author', 'price')
     search_fields = ('title', 'isbn')
     autocomplete_fields = ('author', 'genre')
@@ -55,9 +55,9 @@ class CartItemInline(admin.TabularInline):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['id', 'created_at']
+    list_display = ['id', 'created_at', 'last_activity']
     search_fields = ['id']
-    readonly_fields = ['id', 'created_at']
+    readonly_fields = ['id', 'created_at', 'last_activity']
     inlines = [CartItemInline]
 
 @admin.register(CartItem)
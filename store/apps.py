@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class StoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "store"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if getattr(settings, 'METRICS_ENABLED', True):
+            from .metrics import install_query_recorder, instrument_serializers
+            connection_created.connect(install_query_recorder)
+            instrument_serializers()
+
+        # Idle unless NPLUSONE_MODE is set (the test runner enables it after startup)
+        from .nplusone import install_select_recorder
+        connection_created.connect(install_select_recorder)
@@ -0,0 +1,105 @@
+"""
+Native async (ASGI) versions of the read-heavy catalog endpoints.
+
+DRF views are synchronous, so these are plain Django async views that reuse
+the DRF serializers, cached JWT authentication and JSON renderer. Detail
+rows come from the async ORM; lists run CreatedAtCursorPagination in a
+worker thread, so their cursors match the sync endpoints.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken
+from authentication.backends import CachedJWTAuthentication
+from .models import Genre, Author, Book, Cart
+from .pagination import CreatedAtCursorPagination
+from .serializers import GenraSerializer, AuthorSerializer, BookSerializer, CartSerializer
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def error_response(message, status):
+    return json_response({'detail': message}, status=status)
+
+
+async def authenticate(request):
+    """The user for the request's JWT, resolved from the user cache like the sync API."""
+    try:
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+def require_user(staff=False):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = await authenticate(request)
+            if user is None:
+                return error_response('Authentication credentials were not provided.', 401)
+            if staff and not user.is_staff:
+                return error_response('You do not have permission to perform this action.', 403)
+            request.user = user
+            return await view(request, *args, **kwargs)
+        return require_safe(wrapper)
+    return decorator
+
+
+async def keyset_page(request, queryset, serializer_class):
+    """One page ordered newest first, with CreatedAtCursorPagination's cursors and page size."""
+    paginator = CreatedAtCursorPagination()
+    try:
+        rows = await sync_to_async(paginator.paginate_queryset)(queryset, Request(request))
+    except NotFound as exc:
+        return error_response(exc.detail, 404)
+
+    serializer = serializer_class(rows, many=True, context={'request': request})
+    return json_response({
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': serializer.data,
+    })
+
+
+@require_user()
+async def book_list(request):
+    return await keyset_page(request, Book.objects.select_related('author', 'genre'), BookSerializer)
+
+
+@require_user()
+async def book_detail(request, pk):
+    try:
+        book = await Book.objects.select_related('author', 'genre').aget(pk=pk)
+    except Book.DoesNotExist:
+        return error_response('Not found.', 404)
+    return json_response(BookSerializer(book, context={'request': request}).data)
+
+
+@require_user(staff=True)
+async def genre_list(request):
+    return await keyset_page(request, Genre.objects.all(), GenraSerializer)
+
+
+@require_user(staff=True)
+async def author_detail(request, pk):
+    try:
+        author = await Author.objects.aget(pk=pk)
+    except Author.DoesNotExist:
+        return error_response('Not found.', 404)
+    return json_response(AuthorSerializer(author, context={'request': request}).data)
+
+
+@require_user()
+async def cart_detail(request, pk):
+    try:
+        cart = await Cart.objects.with_totals().aget(pk=pk)
+    except Cart.DoesNotExist:
+        return error_response('Not found.', 404)
+    return json_response(CartSerializer(cart, context={'request': request}).data)
@@ -0,0 +1,87 @@
+"""
+Helpers shared by the benchmark management commands: timing loops,
+percentile summaries and comparison against a saved baseline file.
+"""
+import json
+import math
+import time
+from pathlib import Path
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def measure(func, iterations, warmup=3):
+    """Call func() repeatedly and return a summary of latency and query counts."""
+    for _ in range(warmup):
+        func()
+
+    timings, queries = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            begin = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - begin) * 1000)
+        queries.append(len(ctx.captured_queries))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(timings, elapsed)
+    summary['avg_queries'] = round(sum(queries) / len(queries), 2) if queries else 0.0
+    return summary
+
+
+def summarize(timings, elapsed):
+    """Latency percentiles (ms) and throughput for a list of per-request timings."""
+    return {
+        'iterations': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def format_table(results, baseline=None):
+    header = f"{'scenario':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}"
+    if baseline:
+        header += f"{'p50 vs base':>13}"
+    lines = [header, '-' * len(header)]
+    for name, row in results.items():
+        line = (
+            f"{name:<26}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+            f"{row['throughput_rps']:>10.1f}{_queries(row):>9}"
+        )
+        if baseline:
+            line += f"{_delta(row, baseline.get(name)):>13}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def _queries(row):
+    return f"{row['avg_queries']:.1f}" if 'avg_queries' in row else '-'
+
+
+def _delta(row, base):
+    if not base or not base.get('p50_ms'):
+        return 'new'
+    change = (row['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100
+    return f'{change:+.1f}%'
+
+
+def load_baseline(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(path, results):
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
@@ -0,0 +1,74 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'store:version:{}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_CACHE_ALIAS', 'default')]
+
+
+def get_versions(names):
+    """Return the current version of each model name, initialising missing keys."""
+    cache = get_cache()
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # Seed with a timestamp so an evicted key never comes back as an old version
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def bump_version(*names):
+    cache = get_cache()
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+class VersionedCacheMixin:
+    """
+    Read-through cache for list/retrieve keyed on the model versions in
+    `cache_models`. The ETag is derived from the same key, so a matching
+    If-None-Match is answered with 304 before any query or serialization.
+    """
+    cache_models = ()
+
+    def get_cache_key(self, request):
+        versions = get_versions(self.cache_models)
+        raw = '|'.join([request.build_absolute_uri(), *map(str, versions)])
+        return 'store:response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        key = self.get_cache_key(request)
+        etag = quote_etag(key.rsplit(':', 1)[-1])
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, getattr(settings, 'STORE_CACHE_TIMEOUT', 300))
+        return Response(data, headers={'ETag': etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
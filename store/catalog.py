@@ -0,0 +1,241 @@
+"""
+Bulk catalog import/export.
+
+Records are flat rows of FIELDS, with the author and genre given by name,
+read from CSV or JSON Lines. Imports work in batches: each batch resolves
+its authors and genres by title with a query or two, creating the missing
+ones, then upserts its books by ISBN with a single
+bulk_create(update_conflicts=True). Nothing is held across batches, so
+memory depends on the batch size, not on the file.
+
+bulk_create skips the Book signals, so each batch also refreshes the book
+counts of the authors/genres it touched and reindexes its books, and the
+cache versions are bumped once at the end.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import connection, transaction
+from django.utils.text import slugify
+from .cache import bump_version
+from .models import Author, Book, Genre
+from .search import index_books
+
+FIELDS = ('isbn', 'title', 'description', 'stock', 'price', 'author', 'genre')
+FORMATS = ('csv', 'jsonl')
+BOOK_UPDATE_FIELDS = ['title', 'description', 'stock', 'price', 'author', 'genre', 'updated_at']
+MAX_REPORTED_ERRORS = 100
+MAX_LENGTHS = {
+    'isbn': Book._meta.get_field('isbn').max_length,
+    'title': Book._meta.get_field('title').max_length,
+    'author': Author._meta.get_field('title').max_length,
+    'genre': Genre._meta.get_field('title').max_length,
+}
+MAX_STOCK = connection.ops.integer_field_range(Book._meta.get_field('stock').get_internal_type())[1]
+
+
+class CatalogFileError(ValueError):
+    """The file itself cannot be read (bad encoding, malformed CSV), as opposed to one bad row."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.authors_created = 0
+        self.genres_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': str(message)})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows, 'created': self.created, 'updated': self.updated,
+            'authors_created': self.authors_created, 'genres_created': self.genres_created,
+            'error_count': self.error_count, 'errors': self.errors,
+        }
+
+
+def guess_format(filename, default='csv'):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension, default)
+
+
+def read_records(stream, fmt):
+    """
+    Yield ``(line_number, record)`` from a text stream.
+
+    Raises CatalogFileError when the stream stops being readable; batches
+    already yielded to import_catalog stay imported.
+    """
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for record in reader:
+                yield reader.line_num, record
+        elif fmt == 'jsonl':
+            for line_number, line in enumerate(stream, 1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError:
+                        yield line_number, None
+        else:
+            raise ValueError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+    except UnicodeDecodeError:
+        # Decoding runs a buffer ahead of the parser, so there is no useful line number
+        raise CatalogFileError('The file is not valid UTF-8.')
+    except csv.Error as exc:
+        raise CatalogFileError(f'Malformed CSV after line {reader.line_num}: {exc}')
+
+
+def parse_record(record):
+    """Validate one record and return the cleaned row, raising ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError('Not a JSON object.')
+    row = {field: str(record.get(field) or '').strip() for field in FIELDS}
+    for field in ('isbn', 'title', 'author', 'genre'):
+        if not row[field]:
+            raise ValueError(f'{field} is required.')
+    for field, max_length in MAX_LENGTHS.items():
+        if len(row[field]) > max_length:
+            raise ValueError(f'{field} is longer than {max_length} characters.')
+    try:
+        row['stock'] = int(row['stock'] or 0)
+        row['price'] = Decimal(row['price'])
+    except (ValueError, InvalidOperation):
+        raise ValueError('stock must be an integer and price a decimal.')
+    if not 0 <= row['stock'] <= MAX_STOCK:
+        raise ValueError(f'stock must be between 0 and {MAX_STOCK}.')
+    if not row['price'].is_finite() or row['price'] < 0 or row['price'] >= 10_000:
+        raise ValueError('price is out of range.')
+    row['price'] = row['price'].quantize(Decimal('0.01'))
+    if not slugify(row['genre']):
+        raise ValueError('genre must contain letters or digits.')
+    return row
+
+
+def import_catalog(records, batch_size=1000, progress=None):
+    """Upsert ``(line_number, record)`` pairs; ``progress(result)`` runs after each batch."""
+    result = ImportResult()
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        rows = {}
+        for line_number, record in batch:
+            try:
+                row = parse_record(record)
+            except ValueError as exc:
+                result.add_error(line_number, exc)
+                continue
+            rows[row['isbn']] = row  # the last occurrence of an ISBN wins
+        result.rows += len(batch)
+        if rows:
+            _import_batch(list(rows.values()), result)
+        if progress:
+            progress(result)
+    if result.created or result.updated:
+        bump_version('book', 'author', 'genre')
+    return result
+
+
+def _import_batch(rows, result):
+    with transaction.atomic():
+        genre_ids, created = _resolve_genres({row['genre'] for row in rows})
+        result.genres_created += created
+        author_ids, created = _resolve(Author, 'title', {
+            row['author']: Author(title=row['author'], bio='') for row in rows
+        })
+        result.authors_created += created
+
+        isbns = [row['isbn'] for row in rows]
+        previous = list(Book.objects.filter(isbn__in=isbns).values_list('author_id', 'genre_id'))
+        touched_authors, touched_genres = set(author_ids.values()), set(genre_ids.values())
+        for author_id, genre_id in previous:
+            touched_authors.add(author_id)
+            touched_genres.add(genre_id)
+            result.updated += 1
+        result.created += len(rows) - len(previous)
+
+        Book.objects.bulk_create(
+            [
+                Book(
+                    isbn=row['isbn'], title=row['title'], description=row['description'],
+                    stock=row['stock'], price=row['price'],
+                    author_id=author_ids[row['author']], genre_id=genre_ids[row['genre']],
+                )
+                for row in rows
+            ],
+            update_conflicts=True, update_fields=BOOK_UPDATE_FIELDS,
+            # MySQL's ON DUPLICATE KEY UPDATE has no conflict target
+            unique_fields=['isbn'] if connection.features.supports_update_conflicts_with_target else None,
+        )
+        Author.objects.filter(pk__in=touched_authors).refresh_book_counts()
+        Genre.objects.filter(pk__in=touched_genres).refresh_book_counts()
+        index_books(Book.objects.filter(isbn__in=isbns), batch_size=len(isbns))
+
+
+def _resolve(model, field, wanted):
+    """Map natural keys to primary keys, creating rows for the missing ones."""
+    def lookup(keys):
+        # Oldest row wins when a key is not unique (author titles)
+        rows = model.objects.filter(**{f'{field}__in': keys}).order_by('-pk').values_list(field, 'pk')
+        return dict(rows)
+
+    ids = lookup(list(wanted))
+    missing = [key for key in wanted if key not in ids]
+    if missing:
+        model.objects.bulk_create([wanted[key] for key in missing], ignore_conflicts=True)
+        ids.update(lookup(missing))
+    return ids, len(missing)
+
+
+def _resolve_genres(titles):
+    """Like _resolve on title, but a new title whose slug is taken maps to that genre."""
+    ids = dict(Genre.objects.filter(title__in=titles).order_by('-pk').values_list('title', 'pk'))
+    slugs = {title: slugify(title) for title in titles if title not in ids}
+    if not slugs:
+        return ids, 0
+    by_slug = dict(Genre.objects.filter(slug__in=slugs.values()).values_list('slug', 'pk'))
+    new = {slug: Genre(title=title, slug=slug) for title, slug in slugs.items() if slug not in by_slug}
+    Genre.objects.bulk_create(new.values(), ignore_conflicts=True)
+    by_slug.update(Genre.objects.filter(slug__in=new).values_list('slug', 'pk'))
+    ids.update((title, by_slug[slug]) for title, slug in slugs.items())
+    return ids, len(new)
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_catalog(fmt, chunk_size=2000):
+    """Yield the whole catalog as CSV or JSON Lines, one chunk of rows at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+    rows = Book.objects.order_by('pk').values_list(
+        'pk', 'isbn', 'title', 'description', 'stock', 'price', 'author__title', 'genre__title'
+    )
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(FIELDS)
+    # Keyset slices rather than .iterator(): mysqlclient would buffer the whole result set
+    chunk = list(rows[:chunk_size])
+    while chunk:
+        records = [row[1:] for row in chunk]
+        if fmt == 'csv':
+            yield ''.join(writer.writerow(row) for row in records)
+        else:
+            yield ''.join(
+                json.dumps(dict(zip(FIELDS, row)), default=str, ensure_ascii=False) + '\n' for row in records
+            )
+        if len(chunk) < chunk_size:
+            break
+        chunk = list(rows.filter(pk__gt=chunk[-1][0])[:chunk_size])
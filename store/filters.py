@@ -0,0 +1,59 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class BookFilterSerializer(serializers.Serializer):
+    genre = serializers.IntegerField(required=False)
+    author = serializers.IntegerField(required=False)
+    price_min = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, required=False)
+    price_max = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, required=False)
+    in_stock = serializers.BooleanField(required=False)
+    min_rating = serializers.DecimalField(max_digits=2, decimal_places=1, min_value=0, max_value=5, required=False)
+
+
+class BookFilter(BaseFilterBackend):
+    """
+    ?genre=, ?author=, ?price_min=/?price_max=, ?in_stock= and ?min_rating=.
+
+    Each is served by one of the Book indexes: (genre, created_at),
+    (genre, price), (author, created_at), (price) and (average_rating).
+    in_stock only narrows rows already found through one of those or through
+    the ordering index.
+    """
+    lookups = {
+        'genre': 'genre_id',
+        'author': 'author_id',
+        'price_min': 'price__gte',
+        'price_max': 'price__lte',
+        'min_rating': 'average_rating__gte',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        # A plain dict: with a QueryDict an absent in_stock would read as False
+        params = BookFilterSerializer(data=request.query_params.dict())
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        queryset = queryset.filter(**{self.lookups[name]: value for name, value in data.items() if name in self.lookups})
+        if 'in_stock' in data:
+            queryset = queryset.filter(stock__gt=0) if data['in_stock'] else queryset.filter(stock__lte=0)
+        return queryset
+
+
+class IndexedOrderingFilter(OrderingFilter):
+    """
+    A single ?ordering= term from the view's ordering_fields, each backed by
+    an index, with id appended in the same direction as a tie-breaker.
+    KeysetCursorPagination keys its cursor on the (term, id) pair, so even
+    large groups of equal prices or ratings page without an OFFSET.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params:
+            return self.get_default_ordering(view)
+        valid = {field for field, _ in self.get_valid_fields(queryset, view, {'request': request})}
+        term = params.strip()
+        if ',' in term or term.lstrip('-') not in valid:
+            raise ValidationError({self.ordering_param: [f"Must be one of: {', '.join(sorted(valid))}, optionally prefixed with '-'."]})
+        return [term, '-id' if term.startswith('-') else 'id']
@@ -0,0 +1,122 @@
+"""
+Resized derivatives for uploaded images.
+
+Every original gets a WebP and a JPEG for each entry in VARIANTS, stored
+next to it as `<dir>/variants/<name>/<variant>.<ext>`. The paths are
+derived from the original's name. Generation runs on a thread pool after
+the transaction commits; until it has finished, every variant URL points
+at the original.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from .cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels; the aspect ratio is preserved
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1200,
+}
+FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+QUALITY = 82
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'STORE_IMAGE_WORKERS', 2), thread_name_prefix='store-images'
+        )
+    return _executor
+
+
+def variant_name(name, variant, ext):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', stem, f'{variant}.{ext}')
+
+
+def last_variant_name(name):
+    # generate_variants writes this one last, so once it exists they all do
+    return variant_name(name, list(VARIANTS)[-1], list(FORMATS)[-1])
+
+
+def variant_urls(field_file):
+    """Return {variant: {ext: url}} for an ImageField value, or the original's URL while pending."""
+    storage = field_file.storage
+    if not storage.exists(last_variant_name(field_file.name)):
+        return {variant: {ext: field_file.url for ext in FORMATS} for variant in VARIANTS}
+    return {
+        variant: {ext: storage.url(variant_name(field_file.name, variant, ext)) for ext in FORMATS}
+        for variant in VARIANTS
+    }
+
+
+def generate_variants(storage, name, overwrite=False):
+    """Write every missing derivative of the stored image `name`; return how many were written."""
+    pending = [
+        (variant, ext) for variant in VARIANTS for ext in FORMATS
+        if overwrite or not storage.exists(variant_name(name, variant, ext))
+    ]
+    if not pending:
+        return 0
+
+    with storage.open(name, 'rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+
+    for variant, ext in pending:
+        resized = image.copy()
+        size = VARIANTS[variant]
+        resized.thumbnail((size, size), Image.LANCZOS)
+        if FORMATS[ext] == 'JPEG' and resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        elif resized.mode not in ('RGB', 'RGBA'):
+            resized = resized.convert('RGBA')
+
+        buffer = BytesIO()
+        resized.save(buffer, FORMATS[ext], quality=QUALITY, optimize=True)
+        write_file(storage, variant_name(name, variant, ext), ContentFile(buffer.getvalue()))
+    return len(pending)
+
+
+def write_file(storage, path, content):
+    """Save at exactly `path`; content-addressed storage would otherwise rename it."""
+    if hasattr(storage, 'save_exact'):
+        return storage.save_exact(path, content)
+    if storage.exists(path):
+        storage.delete(path)
+    return storage.save(path, content)
+
+
+def schedule_variants(field_file, *cache_models):
+    """
+    Queue derivative generation for an ImageField value on the thread pool.
+
+    Once new files are written, the response cache of `cache_models` is
+    invalidated so cached bodies stop pointing at the original.
+    """
+    if not field_file:
+        return None
+    future = get_executor().submit(generate_variants, field_file.storage, field_file.name)
+
+    def done(future):
+        if future.exception():
+            logger.error('Image derivative generation failed', exc_info=future.exception())
+        elif future.result() and cache_models:
+            bump_version(*cache_models)
+
+    future.add_done_callback(done)
+    return future
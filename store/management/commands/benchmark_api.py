@@ -0,0 +1,96 @@
+import random
+from uuid import uuid4
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import modify_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from store.benchmarks import measure, format_table, load_baseline, save_baseline
+from store.cache import get_cache
+from store.models import Book, Cart
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+# Diagnostics that add work to every request; timings should not include them
+DIAGNOSTIC_MIDDLEWARE = ['store.metrics.RequestMetricsMiddleware', 'store.nplusone.NPlusOneMiddleware']
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the store and auth routes through the Django test client and report latency '
+        'percentiles, throughput and query counts. Run generate_catalog first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--register-iterations', type=int, default=20,
+                            help='Registration hashes a password, so it gets fewer iterations.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run the named scenario (can be repeated).')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the response cache before every request.')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write this run to --baseline instead of comparing against it.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.cold = options['cold']
+        book_ids = list(Book.objects.values_list('id', flat=True)[:5000])
+        cart_ids = list(Cart.objects.filter(items__isnull=False).values_list('id', flat=True).distinct()[:1000])
+        if not book_ids or not cart_ids:
+            raise CommandError('No books or carts found; run generate_catalog first.')
+
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'email': 'benchmark@example.com'})
+        admin, _ = User.objects.get_or_create(username='benchmark_admin', defaults={'is_staff': True})
+        client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        admin_client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+        anonymous = Client(HTTP_HOST='localhost')
+        pick = self.rng.choice
+
+        scenarios = {
+            'books-list': lambda: client.get('/store/books/'),
+            'book-detail': lambda: client.get(f'/store/books/{pick(book_ids)}/'),
+            'book-reviews': lambda: client.get(f'/store/books/{pick(book_ids)}/review/'),
+            'book-search': lambda: client.get('/store/books/search/', {'q': pick(['sha', 'river crown', 'winter'])}),
+            'authors-list': lambda: admin_client.get('/store/authors/'),
+            'genres-list': lambda: admin_client.get('/store/genres/'),
+            'cart-detail': lambda: client.get(f'/store/carts/{pick(cart_ids)}/'),
+            'cart-add-item': lambda: client.post(
+                f'/store/carts/{pick(cart_ids)}/items/', {'book_id': pick(book_ids), 'quantity': 1}
+            ),
+            'register': lambda: anonymous.post('/auth/register/', self.registration()),
+        }
+        selected = options['scenarios'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+
+        results = {}
+        with modify_settings(MIDDLEWARE={'remove': DIAGNOSTIC_MIDDLEWARE}):
+            for name in selected:
+                iterations = options['register_iterations'] if name == 'register' else options['iterations']
+                results[name] = measure(self.request(scenarios[name]), iterations)
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results)
+            self.stdout.write(format_table(results))
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+        else:
+            self.stdout.write(format_table(results, load_baseline(options['baseline'])))
+
+    def request(self, send):
+        def run():
+            if self.cold:
+                get_cache().clear()
+            response = send()
+            if response.status_code >= 400:
+                raise CommandError(f'{response.request["PATH_INFO"]} returned {response.status_code}')
+        return run
+
+    def registration(self):
+        name = f'bench_{uuid4().hex[:12]}'
+        return {
+            'username': name, 'email': f'{name}@example.com', 'first_name': 'Bench', 'last_name': 'User',
+            'password': 'Sufficiently-Long-9', 'password2': 'Sufficiently-Long-9',
+        }
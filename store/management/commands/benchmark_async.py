@@ -0,0 +1,86 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from store.benchmarks import summarize, format_table
+from store.models import Book
+
+# (label, sync DRF route, native async route); {id} is a random book id
+ENDPOINTS = [
+    ('book-list', '/store/books/', '/store/async/books/'),
+    ('book-detail', '/store/books/{id}/', '/store/async/books/{id}/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the WSGI path, sync DRF views under ASGI and the native async views '
+        'at a given concurrency. Run generate_catalog first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Keep the response cache on (the async views do not use it).')
+
+    def handle(self, *args, **options):
+        self.book_ids = list(Book.objects.values_list('id', flat=True)[:5000])
+        if not self.book_ids:
+            raise CommandError('No books found; run generate_catalog first.')
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'email': 'benchmark@example.com'})
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        self.concurrency = options['concurrency']
+        self.total = options['requests']
+
+        # The test clients always send Host: testserver
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['with_cache']:
+            overrides['STORE_CACHE_TIMEOUT'] = 0
+        with override_settings(**overrides):
+            results = {}
+            for label, sync_route, async_route in ENDPOINTS:
+                results[f'{label} wsgi'] = self.run_wsgi(sync_route)
+                results[f'{label} asgi-sync'] = asyncio.run(self.run_asgi(sync_route))
+                results[f'{label} asgi-native'] = asyncio.run(self.run_asgi(async_route))
+        self.stdout.write(f'concurrency={self.concurrency} requests={self.total}')
+        self.stdout.write(format_table(results))
+
+    def url(self, route):
+        return route.format(id=random.choice(self.book_ids))
+
+    def run_wsgi(self, route):
+        def one(_):
+            begin = time.perf_counter()
+            response = Client().get(self.url(route), headers=self.headers)
+            self.assert_ok(response, route)
+            return (time.perf_counter() - begin) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            timings = list(pool.map(one, range(self.total)))
+        return summarize(timings, time.perf_counter() - started)
+
+    async def run_asgi(self, route):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one():
+            async with semaphore:
+                begin = time.perf_counter()
+                response = await client.get(self.url(route), headers=self.headers)
+                self.assert_ok(response, route)
+                return (time.perf_counter() - begin) * 1000
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(one() for _ in range(self.total)))
+        return summarize(timings, time.perf_counter() - started)
+
+    def assert_ok(self, response, route):
+        if response.status_code != 200:
+            raise CommandError(f'{route} returned {response.status_code}')
@@ -0,0 +1,64 @@
+import time
+import tracemalloc
+from io import BytesIO
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+from store.benchmarks import percentile
+from store.validation import validate_cover_image
+
+# (width, height, format) of the generated sample uploads
+SAMPLES = [
+    (400, 600, 'PNG'),
+    (1200, 1800, 'JPEG'),
+    (2000, 3000, 'JPEG'),
+    (1600, 2400, 'PNG'),
+    (800, 800, 'WEBP'),
+    (100, 150, 'PNG'),  # rejected: too small
+]
+
+
+def legacy_validation(upload):
+    """What a cover upload used to cost: ImageField verify, two Image.open calls, then the size check."""
+    forms.ImageField().to_python(upload)
+    for _ in range(2):
+        upload.seek(0)
+        img = Image.open(upload)
+        img.width, img.height
+    if upload.size > 2048 * 1024:
+        raise ValidationError('too large')
+
+
+class Command(BaseCommand):
+    help = 'Measure per-upload CPU time and peak memory of image validation (legacy vs single pass).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        samples = [self.sample(*spec) for spec in SAMPLES]
+        self.stdout.write(f"{'validator':<14}{'p50 cpu ms':>12}{'p95 cpu ms':>12}{'peak KiB':>10}")
+        for name, validator in [('legacy', legacy_validation), ('single-pass', validate_cover_image)]:
+            cpu, peaks = [], []
+            for _ in range(options['rounds']):
+                for data, filename in samples:
+                    upload = SimpleUploadedFile(filename, data)
+                    tracemalloc.start()
+                    begin = time.process_time()
+                    try:
+                        validator(upload)
+                    except ValidationError:
+                        pass
+                    cpu.append((time.process_time() - begin) * 1000)
+                    peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+                    tracemalloc.stop()
+            self.stdout.write(
+                f'{name:<14}{percentile(cpu, 50):>12.3f}{percentile(cpu, 95):>12.3f}{max(peaks):>10.0f}'
+            )
+
+    def sample(self, width, height, fmt):
+        buffer = BytesIO()
+        Image.effect_noise((width, height), 64).convert('RGB').save(buffer, fmt)
+        return buffer.getvalue(), f'sample_{width}x{height}.{fmt.lower()}'
@@ -0,0 +1,94 @@
+import random
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+from rest_framework_simplejwt.tokens import AccessToken
+from store.benchmarks import measure, format_table
+from store.metrics import RequestMetricsMiddleware, record_query, registry
+from store.models import Book
+
+ENDPOINTS = [
+    ('book-list', '/store/books/'),
+    ('book-detail', '/store/books/{id}/'),
+    ('book-list 100', '/store/books/?page_size=100'),
+]
+MIDDLEWARE = 'store.metrics.RequestMetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the overhead of RequestMetricsMiddleware by timing the same requests '
+        'with it on and off, interleaved. Run generate_catalog first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--rounds', type=int, default=3,
+                            help='Alternate on/off this many times to spread out noise.')
+
+    def handle(self, *args, **options):
+        book_ids = list(Book.objects.values_list('id', flat=True)[:5000])
+        if not book_ids:
+            raise CommandError('No books found; run generate_catalog first.')
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'email': 'benchmark@example.com'})
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+        enabled = [m for m in settings.MIDDLEWARE if m != MIDDLEWARE]
+        enabled.insert(enabled.index('store.media.MediaFileMiddleware') + 1, MIDDLEWARE)
+        disabled = [m for m in enabled if m != MIDDLEWARE]
+        # Nothing slow gets logged and the sampler stays off, as for most production requests
+        common = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            'STORE_CACHE_TIMEOUT': 0,
+            'METRICS_SLOW_REQUEST_SECONDS': None,
+        }
+
+        samples = {}
+        for _ in range(options['rounds']):
+            for state, middleware in (('off', disabled), ('on', enabled)):
+                with override_settings(MIDDLEWARE=middleware, **common):
+                    client = Client()
+                    for label, route in ENDPOINTS:
+                        def request():
+                            response = client.get(route.format(id=random.choice(book_ids)), headers=headers)
+                            if response.status_code != 200:
+                                raise CommandError(f'{route} returned {response.status_code}')
+
+                        samples.setdefault(f'{label} {state}', []).append(measure(request, options['iterations']))
+
+        # Median of the per-round summaries
+        results = {
+            name: {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+            for name, runs in samples.items()
+        }
+        self.stdout.write(format_table(results))
+        for label, _ in ENDPOINTS:
+            off, on = results[f'{label} off']['p50_ms'], results[f'{label} on']['p50_ms']
+            self.stdout.write(f'{label}: p50 overhead {on - off:+.3f} ms ({(on - off) / off * 100:+.1f}%)')
+        self.stdout.write(f'middleware alone: {self.middleware_cost():.1f} us per request (one query, no view)')
+
+    def middleware_cost(self, iterations=20000):
+        """The fixed per-request cost, free of view and network noise."""
+        request = RequestFactory().get('/store/books/')
+        request.resolver_match = resolve('/store/books/')
+        response = HttpResponse()
+
+        def view(request):
+            # Stands in for the view's SQL going through the execute wrapper
+            record_query(lambda *args: None, 'SELECT 1', (), False, {})
+            return response
+
+        with override_settings(METRICS_SLOW_REQUEST_SECONDS=None):
+            middleware = RequestMetricsMiddleware(view)
+        timings = []
+        for handler in (view, middleware):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                handler(request)
+            timings.append((time.perf_counter() - start) / iterations * 1e6)
+        registry.reset()
+        return timings[1] - timings[0]
@@ -0,0 +1,24 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.schema import code_version, generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI document once and write it where the schema views serve it from.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_PATH,
+                            help='Defaults to OPENAPI_SCHEMA_PATH.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        content = generate_schema()
+        # Write-then-rename so running servers never read a half-written file
+        tmp = f'{output}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, output)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(content)} bytes for {code_version()} to {output}.'
+        ))
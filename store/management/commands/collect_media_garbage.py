@@ -0,0 +1,58 @@
+import posixpath
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from store.images import FORMATS, VARIANTS, variant_name
+from store.models import Author, Book, Review
+
+IMAGE_FIELDS = [(Book, 'cover_image'), (Author, 'image'), (Review, 'image')]
+
+
+class Command(BaseCommand):
+    help = 'Delete stored images (and their derivatives) that no Book, Author or Review references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Keep files newer than this; their rows may not be committed yet.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        deleted = kept = 0
+
+        for model, field_name in IMAGE_FIELDS:
+            field = model._meta.get_field(field_name)
+            storage = field.storage
+            referenced = self.referenced_names(model, field_name)
+            for name in self.walk(storage, field.upload_to.rstrip('/')):
+                if name in referenced or posixpath.basename(name).startswith('.upload-'):
+                    kept += 1
+                    continue
+                if storage.get_modified_time(name) > cutoff:
+                    kept += 1
+                    continue
+                deleted += 1
+                if options['dry_run']:
+                    self.stdout.write(f'Would delete {name}')
+                else:
+                    storage.delete(name)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} unreferenced file(s); kept {kept}.'))
+
+    def referenced_names(self, model, field_name):
+        names = set()
+        rows = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+        for name in rows.values_list(field_name, flat=True).distinct().iterator():
+            names.add(name)
+            names.update(variant_name(name, variant, ext) for variant in VARIANTS for ext in FORMATS)
+        return names
+
+    def walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        subdirs, files = storage.listdir(directory)
+        for filename in files:
+            yield posixpath.join(directory, filename)
+        for subdir in subdirs:
+            yield from self.walk(storage, posixpath.join(directory, subdir))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from store.catalog import FORMATS, export_catalog, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Stream the catalog out as CSV or JSON Lines (the format import_catalog reads).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='File to write, or "-" for stdout.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, then csv.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        chunks = export_catalog(fmt, chunk_size=options['chunk_size'])
+        if path == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            stream.writelines(chunks)
+        self.stdout.write(self.style.SUCCESS(f'Exported the catalog to {path}.'))
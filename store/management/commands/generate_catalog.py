@@ -0,0 +1,123 @@
+import random
+from itertools import islice
+from decimal import Decimal
+from uuid import uuid4
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from store.cache import bump_version
+from store.models import Genre, Author, Book, BookRatingHistogram, Review, Customer, Cart, CartItem
+from store.search import index_books
+
+WORDS = (
+    'shadow river crown silent garden winter empire glass letter city night '
+    'stone ember hollow distant harbor secret broken iron summer forest last '
+    'golden paper orchard storm quiet wild northern house road memory sea'
+).split()
+
+BENCHMARK_PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalog (authors, genres, books, users, reviews, carts) for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--genres', type=int, default=20)
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--carts', type=int, default=1000)
+        parser.add_argument('--items-per-cart', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.run = uuid4().hex[:6]
+
+        genre_ids = self.create(Genre, (
+            Genre(title=self.words(2)[:24] + f' {i}', slug=f'bench-{self.run}-{i}')
+            for i in range(options['genres'])
+        ))
+        author_ids = self.create(Author, (
+            Author(title=self.words(2).title(), bio=self.words(60))
+            for _ in range(options['authors'])
+        ))
+        last_book_id = self.last_id(Book)
+        book_ids = self.create(Book, (
+            Book(
+                title=self.words(self.rng.randint(1, 5)).title(),
+                description=self.words(120),
+                stock=self.rng.randint(0, 200),
+                isbn=f'979{last_book_id + i + 1:010d}',
+                price=Decimal(self.rng.randint(299, 9999)) / 100,
+                author_id=self.rng.choice(author_ids),
+                genre_id=self.rng.choice(genre_ids),
+            )
+            for i in range(options['books'])
+        )) if author_ids and genre_ids else []
+
+        password = make_password(BENCHMARK_PASSWORD)
+        user_ids = self.create(User, (
+            User(username=f'bench_{self.run}_{i}', email=f'bench_{self.run}_{i}@example.com',
+                 first_name='Bench', last_name=f'User {i}', password=password)
+            for i in range(options['users'])
+        ))
+        self.create(Customer, (Customer(user_id=user_id, phone='555-0100') for user_id in user_ids))
+
+        # Pair every book with distinct users so (user, book) stays unique
+        review_count = min(options['reviews'], len(book_ids) * len(user_ids))
+        self.create(Review, (
+            Review(
+                book_id=book_ids[i % len(book_ids)],
+                user_id=user_ids[(i // len(book_ids)) % len(user_ids)],
+                score=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 4, 6, 5])[0],
+                description=self.words(40),
+            )
+            for i in range(review_count)
+        ))
+
+        cart_ids = self.create(Cart, (Cart() for _ in range(options['carts'])))
+        per_cart = min(options['items_per_cart'], len(book_ids))
+        self.create(CartItem, (
+            CartItem(cart_id=cart_id, book_id=book_id, quantity=self.rng.randint(1, 3))
+            for cart_id in cart_ids
+            for book_id in self.rng.sample(book_ids, per_cart)
+        ))
+
+        # bulk_create skips the signals that maintain these
+        books = Book.objects.filter(pk__gt=last_book_id)
+        books.refresh_rating_aggregates()
+        BookRatingHistogram.objects.rebuild(books)
+        Author.objects.filter(pk__in=author_ids).refresh_book_counts()
+        Genre.objects.filter(pk__in=genre_ids).refresh_book_counts()
+        index_books(books, batch_size=self.batch_size)
+        bump_version('book', 'author', 'genre')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(genre_ids)} genres, {len(author_ids)} authors, {len(book_ids)} books, '
+            f'{len(user_ids)} users, {review_count} reviews and {len(cart_ids)} carts '
+            f'(users share the password {BENCHMARK_PASSWORD!r}).'
+        ))
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def create(self, model, objects):
+        """bulk_create in batches and return the new primary keys (MySQL does not return them)."""
+        # Cart ids are UUIDs assigned in Python; the rest are auto-increment
+        last_id = None if model is Cart else self.last_id(model)
+        created = []
+        objects = iter(objects)
+        while batch := list(islice(objects, self.batch_size)):
+            created.extend(model.objects.bulk_create(batch))
+        self.stdout.write(f'  {model.__name__}: {len(created)}')
+
+        if last_id is None:
+            return [obj.pk for obj in created]
+        return list(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True))
+
+    def last_id(self, model):
+        return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
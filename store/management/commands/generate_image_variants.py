@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from store.images import generate_variants
+from store.models import Author, Book, Review
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized derivatives for book covers, author photos and review images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='Regenerate derivatives that already exist.')
+
+    def handle(self, *args, **options):
+        sources = [(Book, 'cover_image'), (Author, 'image'), (Review, 'image')]
+        written = 0
+        for model, field in sources:
+            storage = model._meta.get_field(field).storage
+            names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+            for name in names.iterator():
+                if not storage.exists(name):
+                    self.stderr.write(f'Missing original: {name}')
+                    continue
+                written += generate_variants(storage, name, overwrite=options['overwrite'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} derivative file(s).'))
@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from store.catalog import FORMATS, CatalogFileError, guess_format, import_catalog, read_records
+
+
+class Command(BaseCommand):
+    help = 'Stream-import books (with their authors and genres) from CSV or JSON Lines, upserting by ISBN.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or "-" for stdin.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, then csv.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            result = import_catalog(
+                read_records(stream, fmt), batch_size=options['batch_size'], progress=self.report
+            )
+        except (OSError, CatalogFileError) as exc:
+            raise CommandError(exc)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in result.errors:
+            self.stderr.write(f'  line {error["line"]}: {error["error"]}')
+        style = self.style.WARNING if result.error_count else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Imported {result.created + result.updated} of {result.rows} row(s): {result.created} created, '
+            f'{result.updated} updated, {result.authors_created} new author(s), '
+            f'{result.genres_created} new genre(s), {result.error_count} rejected.'
+        ))
+
+    def report(self, result):
+        self.stdout.write(f'  {result.rows} rows read, {result.created} created, {result.updated} updated')
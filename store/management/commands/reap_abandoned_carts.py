@@ -0,0 +1,68 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from store.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete carts (and their items) with no item writes for longer than the TTL. '
+        'Meant to run from cron, e.g. hourly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=float, default=None,
+                            help='Idle time before a cart is deleted; defaults to settings.CART_TTL_DAYS.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Carts deleted per transaction, which bounds how many rows are locked at once.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches, to spread the load.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        ttl_days = options['ttl_days']
+        if ttl_days is None:
+            ttl_days = getattr(settings, 'CART_TTL_DAYS', 30)
+        ttl = timedelta(days=ttl_days)
+
+        if options['dry_run']:
+            carts = Cart.objects.abandoned(ttl)
+            items = CartItem.objects.filter(cart__in=carts).count()
+            self.stdout.write(f'Would delete {carts.count()} cart(s) and {items} cart item(s).')
+            return
+
+        cutoff = timezone.now() - ttl
+        carts = items = batches = 0
+        last = None
+        while True:
+            with transaction.atomic():
+                # Cart ids are random UUIDs, so batches are ranges of the last_activity
+                # index instead, continued from the previous batch's last (last_activity, id).
+                pending = Cart.objects.filter(last_activity__lt=cutoff)
+                if last is not None:
+                    pending = pending.filter(Q(last_activity__gt=last[0]) | Q(last_activity=last[0], id__gt=last[1]))
+                rows = list(
+                    pending.select_for_update().order_by('last_activity', 'id')
+                    .values_list('last_activity', 'id')[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                # The cutoff is checked again in case a cart was touched since it was read
+                _, deleted = Cart.objects.filter(pk__in=[pk for _, pk in rows], last_activity__lt=cutoff).delete()
+            last = rows[-1]
+            batches += 1
+            carts += deleted.get(Cart._meta.label, 0)
+            items += deleted.get(CartItem._meta.label, 0)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Batch {batches}: {carts} cart(s), {items} item(s) so far.')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reclaimed {carts + items} row(s): {carts} cart(s) and {items} cart item(s) '
+            f'idle for over {ttl_days:g} day(s), in {batches} batch(es).'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.cache import bump_version
+from store.models import Author, Genre
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Author.book_count and Genre.book_count from the Book table.'
+
+    def handle(self, *args, **options):
+        authors = Author.objects.refresh_book_counts()
+        genres = Genre.objects.refresh_book_counts()
+        bump_version('author', 'genre')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt book counts for {authors} author(s) and {genres} genre(s).'))
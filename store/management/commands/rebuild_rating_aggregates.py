@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from store.cache import bump_version
+from store.models import Book, BookRatingHistogram
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Book.rating_sum, rating_count, average_rating and the rating histograms from the Review table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book', type=int, action='append', dest='book_ids',
+                            help='Only rebuild the given book id (can be repeated).')
+
+    def handle(self, *args, **options):
+        books = Book.objects.all()
+        if options['book_ids']:
+            books = books.filter(pk__in=options['book_ids'])
+        updated = books.refresh_rating_aggregates()
+        BookRatingHistogram.objects.rebuild(books)
+        bump_version('book')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} book(s).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from store.models import Book
+from store.search import index_books
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the book full-text search documents from Book, Author and Genre.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = index_books(Book.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} book(s).'))
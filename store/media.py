@@ -0,0 +1,171 @@
+"""
+Production media serving: conditional GETs, single byte ranges, caching and
+optional hand-off to the front web server via X-Accel-Redirect/X-Sendfile.
+
+Only names in the content-addressed layout of store/storage.py are cached
+as immutable. Image variants live at fixed paths and are rewritten by
+generate_image_variants --overwrite, and legacy uploads predate hashing, so
+those get a short max-age and are revalidated against their ETag.
+
+Only raster image types are served inline. Anything else under MEDIA_ROOT
+is sent as an octet-stream attachment, so an uploaded HTML or SVG file
+cannot run script on this origin.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# <upload_to>/ab/cd/abcd<60 more hex digits>.<ext>
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.\w+$')
+CHUNK_SIZE = 64 * 1024
+INLINE_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/gif'}
+
+
+def content_type_for(path):
+    content_type = mimetypes.guess_type(path)[0]
+    return content_type if content_type in INLINE_CONTENT_TYPES else 'application/octet-stream'
+
+
+def cache_control(path):
+    if CONTENT_ADDRESSED_RE.search(path):
+        return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 31536000)}, immutable"
+    return f"public, max-age={getattr(settings, 'MEDIA_MUTABLE_CACHE_MAX_AGE', 300)}, must-revalidate"
+
+
+def media_headers(response, path, stat, etag, content_type):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Type'] = content_type
+    response['X-Content-Type-Options'] = 'nosniff'
+    if content_type not in INLINE_CONTENT_TYPES:
+        response['Content-Disposition'] = 'attachment'
+    return response
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable byte range, None if absent,
+    or False if invalid. Multiple ranges are ignored (None), which RFC 9110
+    allows, so the whole file is sent with 200.
+    """
+    if not header or ',' in header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return False
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_range(path, start, end):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found.')
+
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+    content_type = content_type_for(full_path)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return media_headers(not_modified, path, stat, etag, content_type)
+
+    handoff = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if handoff:
+        # The front server streams the file (and handles Range) without holding a worker
+        response = HttpResponse()
+        if handoff == 'X-Accel-Redirect':
+            prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            response[handoff] = prefix + quote(path)
+        else:
+            response[handoff] = full_path
+        return media_headers(response, path, stat, etag, content_type)
+
+    byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if byte_range is None:
+        # FileResponse uses wsgi.file_wrapper, i.e. sendfile() where the server supports it
+        response = FileResponse(open(full_path, 'rb'))
+        return media_headers(response, path, stat, etag, content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(iter_range(full_path, start, end), status=206)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Content-Length'] = str(end - start + 1)
+    return media_headers(response, path, stat, etag, content_type)
+
+
+class MediaFileMiddleware:
+    """
+    Serve MEDIA_URL requests before the session/auth/CSRF middleware run.
+    Place it directly after SecurityMiddleware. Under ASGI the file work runs
+    in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.MEDIA_URL
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path.startswith(self.prefix):
+            return self.serve(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path.startswith(self.prefix):
+            return await sync_to_async(self.serve, thread_sensitive=False)(request)
+        return await self.get_response(request)
+
+    def serve(self, request):
+        try:
+            return serve_media(request, request.path[len(self.prefix):])
+        except Http404:
+            return HttpResponse('Media file not found.', status=404, content_type='text/plain')
@@ -0,0 +1,350 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+RequestMetricsMiddleware times each request and files it under its resolved
+route name (``book-list``, ``cart-items-detail``...). While the request runs,
+a per-connection execute wrapper counts and times its SQL. A wrapper around
+BaseSerializer.data times serialization. Both read the current request from
+a ContextVar and do nothing outside a request. Statements repeated within a
+request are counted as duplicates, and the most frequent ones are kept per
+route by fingerprint.
+
+Requests slower than METRICS_SLOW_REQUEST_SECONDS are logged. A
+METRICS_PROFILE_SAMPLE_RATE share of requests is also stack-sampled from a
+background thread, and the hottest stacks are logged with the slow request.
+Async requests are timed the same way but never sampled: their work is
+spread over the event loop and sync_to_async threads.
+
+Metrics live in process memory, so each worker is scraped separately
+(GET /store/metrics/, admin only).
+"""
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TOP_FINGERPRINTS = 10
+STACK_DEPTH = 12
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+_current = ContextVar('store_request_metrics', default=None)
+
+
+def fingerprint(sql):
+    """Collapse IN lists and inlined numbers (e.g. LIMIT) so repeated statements group together."""
+    return NUMBER_RE.sub('N', IN_LIST_RE.sub('(%s, ...)', sql))
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_seconds', 'statements', 'serializer_seconds', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+    def duplicates(self):
+        """Extra executions per fingerprint, for statements run more than once."""
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[fingerprint(sql)] += count
+        return Counter({fp: count - 1 for fp, count in fingerprints.items() if count > 1})
+
+
+def current_request_metrics():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_seconds += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.statements[sql] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver: wrap every new connection once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_serializers():
+    """Time the top-level serializer.data calls made during a request."""
+    original = BaseSerializer.data
+    if getattr(original.fget, 'instrumented', False):
+        return
+
+    def data(self):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return original.fget(self)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            metrics.serializer_seconds += time.perf_counter() - start
+            metrics.serializing = False
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
+
+
+class RouteStats:
+    def __init__(self):
+        self.responses = Counter()
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.duplicate_queries = 0
+        self.fingerprints = Counter()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = defaultdict(RouteStats)
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+    def observe(self, route, method, status_code, seconds, metrics):
+        duplicates = metrics.duplicates() if metrics.queries > 1 else None
+        with self.lock:
+            stats = self.routes[route]
+            stats.responses[method, f'{status_code // 100}xx'] += 1
+            stats.count += 1
+            stats.seconds += seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+            stats.serializer_seconds += metrics.serializer_seconds
+            stats.queries += metrics.queries
+            stats.sql_seconds += metrics.sql_seconds
+            if duplicates:
+                stats.duplicate_queries += sum(duplicates.values())
+                stats.fingerprints.update(duplicates)
+                if len(stats.fingerprints) > TOP_FINGERPRINTS * 4:
+                    stats.fingerprints = Counter(dict(stats.fingerprints.most_common(TOP_FINGERPRINTS)))
+
+    def render(self):
+        """The registry in Prometheus text exposition format (0.0.4)."""
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+            family('store_http_requests_total', 'counter', 'Responses by route, method and status class.')
+            for route, stats in routes:
+                for (method, status), count in sorted(stats.responses.items()):
+                    lines.append(f'store_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+            family('store_http_request_duration_seconds', 'histogram', 'Wall time until the response is returned.')
+            for route, stats in routes:
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    lines.append(f'store_http_request_duration_seconds_bucket{_labels(route=route, le=bound)} {count}')
+                lines.append(f'store_http_request_duration_seconds_bucket{_labels(route=route, le="+Inf")} {stats.count}')
+                lines.append(f'store_http_request_duration_seconds_sum{_labels(route=route)} {stats.seconds:.6f}')
+                lines.append(f'store_http_request_duration_seconds_count{_labels(route=route)} {stats.count}')
+
+            for name, attr, help_text in (
+                ('store_serializer_seconds_total', 'serializer_seconds', 'Time spent in serializer.data (includes its SQL).'),
+                ('store_db_queries_total', 'queries', 'SQL statements executed.'),
+                ('store_db_query_seconds_total', 'sql_seconds', 'Time spent executing SQL.'),
+                ('store_db_duplicate_queries_total', 'duplicate_queries', 'Statements repeated within the same request.'),
+            ):
+                family(name, 'counter', help_text)
+                for route, stats in routes:
+                    value = getattr(stats, attr)
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{_labels(route=route)} {value}')
+
+            family('store_db_duplicate_query_fingerprint_total', 'counter',
+                   f'Repeated statements by fingerprint, top {TOP_FINGERPRINTS} per route.')
+            for route, stats in routes:
+                for fp, count in stats.fingerprints.most_common(TOP_FINGERPRINTS):
+                    lines.append(
+                        f'store_db_duplicate_query_fingerprint_total{_labels(route=route, fingerprint=fp[:200])} {count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = MetricsRegistry()
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from one daemon thread, only while any are registered."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.thread = None
+
+    def start(self, ident):
+        with self.lock:
+            self.samples[ident] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='store-metrics-sampler', daemon=True)
+                self.thread.start()
+
+    def stop(self, ident):
+        with self.lock:
+            return self.samples.pop(ident, Counter())
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.samples:
+                    self.thread = None
+                    return
+                for ident, counter in self.samples.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counter[stack_key(frame)] += 1
+
+
+def stack_key(frame):
+    stack = []
+    while frame is not None and len(stack) < STACK_DEPTH:
+        stack.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return tuple(stack)
+
+
+def format_stack(stack):
+    base = str(Path(settings.BASE_DIR)) + '/'
+    return ' <- '.join(f'{filename.removeprefix(base)}:{line} {name}' for filename, line, name in stack)
+
+
+_sampler = None
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = StackSampler(getattr(settings, 'METRICS_PROFILE_INTERVAL', 0.005))
+    return _sampler
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else 'unmatched'
+
+
+class RequestMetricsMiddleware:
+    """
+    Records per-route metrics for every request. Place it right after
+    MediaFileMiddleware so the rest of the middleware stack is included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+        self.profile_rate = getattr(settings, 'METRICS_PROFILE_SAMPLE_RATE', 0) if self.slow_seconds else 0
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        ident = threading.get_ident()
+        profiled = self.profile_rate and random.random() < self.profile_rate
+        if profiled:
+            get_sampler().start(ident)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - start
+            _current.reset(token)
+            stacks = get_sampler().stop(ident) if profiled else None
+        return self.record(request, response, seconds, metrics, stacks)
+
+    async def __acall__(self, request):
+        # The context (and so _current) is copied into sync_to_async threads, where the queries run
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - start
+            _current.reset(token)
+        return self.record(request, response, seconds, metrics, None)
+
+    def record(self, request, response, seconds, metrics, stacks):
+        route = route_name(request)
+        registry.observe(route, request.method, response.status_code, seconds, metrics)
+        if self.slow_seconds is not None and seconds >= self.slow_seconds:
+            self.log_slow_request(request, route, seconds, metrics, stacks)
+        return response
+
+    def log_slow_request(self, request, route, seconds, metrics, stacks):
+        lines = [
+            f'Slow request {request.method} {request.path} ({route}): {seconds * 1000:.0f} ms, '
+            f'{metrics.queries} queries in {metrics.sql_seconds * 1000:.0f} ms, '
+            f'serializer {metrics.serializer_seconds * 1000:.0f} ms'
+        ]
+        for fp, count in metrics.duplicates().most_common(3):
+            lines.append(f'  repeated {count}x: {fp[:200]}')
+        if stacks:
+            total = sum(stacks.values())
+            for stack, count in stacks.most_common(5):
+                lines.append(f'  {count}/{total} samples: {format_stack(stack)}')
+        logger.warning('\n'.join(lines))
+
+
+class MetricsView(APIView):
+    """Prometheus scrape endpoint for this worker's metrics."""
+    permission_classes = [permissions.IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:07
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Book = apps.get_model("store", "Book")
+    Review = apps.get_model("store", "Review")
+    ratings = Review.objects.filter(book=OuterRef("pk")).order_by().values("book")
+    Book.objects.update(
+        rating_sum=Coalesce(
+            Subquery(ratings.annotate(total=Sum("score")).values("total")), Value(0)
+        ),
+        rating_count=Coalesce(
+            Subquery(ratings.annotate(total=Count("id")).values("total")), Value(0)
+        ),
+        average_rating=Coalesce(
+            Subquery(ratings.annotate(avg=Round(Avg("score"), 1)).values("avg")),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0004_remove_cart_updated_at_remove_cart_user_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="average_rating",
+            field=models.DecimalField(
+                decimal_places=1, default=0, editable=False, max_digits=3
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
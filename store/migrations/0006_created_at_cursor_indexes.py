@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_book_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                fields=["created_at", "id"], name="author_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["created_at", "id"], name="book_created_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="genre",
+            index=models.Index(
+                fields=["created_at", "id"], name="genre_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE store_booksearch_fts USING fts5("
+    "title, description, author, genre, "
+    "content='store_booksearchdocument', content_rowid='book_id')",
+    "CREATE TRIGGER store_booksearch_ai AFTER INSERT ON store_booksearchdocument BEGIN "
+    "INSERT INTO store_booksearch_fts(rowid, title, description, author, genre) "
+    "VALUES (new.book_id, new.title, new.description, new.author, new.genre); END",
+    "CREATE TRIGGER store_booksearch_ad AFTER DELETE ON store_booksearchdocument BEGIN "
+    "INSERT INTO store_booksearch_fts(store_booksearch_fts, rowid, title, description, author, genre) "
+    "VALUES ('delete', old.book_id, old.title, old.description, old.author, old.genre); END",
+    "CREATE TRIGGER store_booksearch_au AFTER UPDATE ON store_booksearchdocument BEGIN "
+    "INSERT INTO store_booksearch_fts(store_booksearch_fts, rowid, title, description, author, genre) "
+    "VALUES ('delete', old.book_id, old.title, old.description, old.author, old.genre); "
+    "INSERT INTO store_booksearch_fts(rowid, title, description, author, genre) "
+    "VALUES (new.book_id, new.title, new.description, new.author, new.genre); END",
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS store_booksearch_au",
+    "DROP TRIGGER IF EXISTS store_booksearch_ad",
+    "DROP TRIGGER IF EXISTS store_booksearch_ai",
+    "DROP TABLE IF EXISTS store_booksearch_fts",
+]
+
+MYSQL_FULLTEXT = [
+    "ALTER TABLE store_booksearchdocument "
+    "ADD FULLTEXT INDEX booksearch_fulltext_idx (title, description, author, genre)",
+]
+
+MYSQL_FULLTEXT_DROP = [
+    "ALTER TABLE store_booksearchdocument DROP INDEX booksearch_fulltext_idx",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_FTS, "mysql": MYSQL_FULLTEXT}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_FTS_DROP, "mysql": MYSQL_FULLTEXT_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def backfill_search_documents(apps, schema_editor):
+    Book = apps.get_model("store", "Book")
+    BookSearchDocument = apps.get_model("store", "BookSearchDocument")
+    rows = Book.objects.values_list(
+        "id", "title", "description", "author__title", "genre__title"
+    )
+    BookSearchDocument.objects.bulk_create(
+        [
+            BookSearchDocument(
+                book_id=book_id,
+                title=title,
+                description=description,
+                author=author,
+                genre=genre,
+            )
+            for book_id, title, description, author, genre in rows.iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_created_at_cursor_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookSearchDocument",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="store.book",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                ("description", models.TextField()),
+                ("author", models.CharField(max_length=255)),
+                ("genre", models.CharField(max_length=30)),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
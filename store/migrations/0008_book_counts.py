@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_book_counts(apps, schema_editor):
+    Book = apps.get_model("store", "Book")
+    for model_name in ("Author", "Genre"):
+        field = model_name.lower()
+        counts = (
+            Book.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        apps.get_model("store", model_name).objects.update(
+            book_count=Coalesce(Subquery(counts), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_book_search_document"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="author",
+            name="book_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="genre",
+            name="book_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_book_counts, migrations.RunPython.noop),
+    ]
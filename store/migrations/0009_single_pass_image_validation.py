@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:19
+
+import store.validation
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_book_counts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="author",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to="authors/",
+                validators=[store.validation.validate_author_image],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="cover_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to="book_covers/",
+                validators=[store.validation.validate_cover_image],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="review",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to="review_img/",
+                validators=[store.validation.validate_review_image],
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_content_addressed_media"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["genre", "created_at"], name="book_genre_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["genre", "price"], name="book_genre_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["author", "created_at"], name="book_author_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["price"], name="book_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["average_rating"], name="book_rating_idx"),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_histograms(apps, schema_editor):
+    Review = apps.get_model("store", "Review")
+    BookRatingHistogram = apps.get_model("store", "BookRatingHistogram")
+    histograms = {}
+    rows = Review.objects.order_by().values_list("book_id", "score").annotate(n=Count("id"))
+    for book_id, score, n in rows.iterator():
+        histogram = histograms.setdefault(book_id, BookRatingHistogram(book_id=book_id))
+        setattr(histogram, f"stars_{score}", n)
+    BookRatingHistogram.objects.bulk_create(histograms.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_book_filter_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookRatingHistogram",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_histogram",
+                        serialize=False,
+                        to="store.book",
+                    ),
+                ),
+                ("stars_1", models.PositiveIntegerField(default=0)),
+                ("stars_2", models.PositiveIntegerField(default=0)),
+                ("stars_3", models.PositiveIntegerField(default=0)),
+                ("stars_4", models.PositiveIntegerField(default=0)),
+                ("stars_5", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["book", "created_at"], name="review_book_created_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_rating_histograms, migrations.RunPython.noop),
+    ]
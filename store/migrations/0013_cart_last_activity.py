@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:53
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_activity(apps, schema_editor):
+    # Item writes were never timestamped, so only carts that never got an item
+    # are known to have been idle since creation; the rest start their TTL now.
+    Cart = apps.get_model("store", "Cart")
+    Cart.objects.filter(items__isnull=True).update(last_activity=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0012_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="last_activity",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,45 @@
-from django.db import models
+from collections import defaultdict
+from django.db import models, connection, transaction
 from django.contrib.auth.models import User
 from django.contrib import admin
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db.models import OuterRef, Subquery, Sum, Count, Avg, Value, F, Prefetch, ExpressionWrapper
+from django.db.models.functions import Coalesce, Round
 from uuid import uuid4
+from decimal import Decimal
 from django.utils.text import slugify
 from django.utils import timezone  
-from .validation import validate_cover_image_size, validate_image_file_size, validate_author_image_size
+from .storage import media_storage
+from .validation import validate_cover_image, validate_author_image, validate_review_image
+
+class BookCountQuerySet(models.QuerySet):
+    def refresh_book_counts(self):
+        """Recompute book_count from the Book table in one UPDATE."""
+        field = self.model._meta.model_name  # Book.author / Book.genre
+        books = Book.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        counts = books.annotate(total=Count('id')).values('total')
+        return self.update(book_count=Coalesce(Subquery(counts), Value(0)))
+
+    def adjust_book_count(self, pk, delta):
+        return self.filter(pk=pk).update(book_count=F('book_count') + delta)
+
 
 # Genre Model
 class Genre(models.Model):
     title = models.CharField(max_length=30)
     slug = models.SlugField(unique=True, blank=True)
     featured_book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True, related_name='+', blank=True)
+    # Denormalized from Book, kept in sync by store.signals
+    book_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookCountQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='genre_created_id_idx')]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -28,14 +52,32 @@ class Genre(models.Model):
 class Author(models.Model):
     title = models.CharField(max_length=255)
     bio = models.TextField()
-    image = models.ImageField(upload_to='authors/', validators=[validate_author_image_size, validate_image_file_size], null=True, blank=True)
+    image = models.ImageField(upload_to='authors/', storage=media_storage, validators=[validate_author_image], null=True, blank=True)
+    # Denormalized from Book, kept in sync by store.signals
+    book_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookCountQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='author_created_id_idx')]
+
     def __str__(self):
         return self.title
 
 # Book Model
+class BookQuerySet(models.QuerySet):
+    def refresh_rating_aggregates(self):
+        """Recompute the denormalized rating columns from the Review table in one UPDATE."""
+        ratings = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        return self.update(
+            rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('score')).values('total')), Value(0)),
+            rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), Value(0)),
+            average_rating=Coalesce(Subquery(ratings.annotate(avg=Round(Avg('score'), 1)).values('avg')), Value(0)),
+        )
+
+
 class Book(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -44,31 +86,132 @@ class Book(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2)
     author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='books')
     genre = models.ForeignKey(Genre, on_delete=models.CASCADE,related_name='books')
-    cover_image = models.ImageField(upload_to='book_covers/', validators=[validate_cover_image_size, validate_image_file_size], null=True, blank=True)
+    cover_image = models.ImageField(upload_to='book_covers/', storage=media_storage, validators=[validate_cover_image], null=True, blank=True)
+    # Denormalized from Review, kept in sync by store.signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.DecimalField(max_digits=3, decimal_places=1, default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def average_rating(self):
-        ratings = self.ratings.all()
-        return round(sum(r.score for r in ratings) / ratings.count(), 1) if ratings.exists() else 0
+    objects = BookQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='book_created_id_idx'),
+            # Back the BookViewSet filters/orderings (store/filters.py); the
+            # primary key is the implicit last column of each
+            models.Index(fields=['genre', 'created_at'], name='book_genre_created_idx'),
+            models.Index(fields=['genre', 'price'], name='book_genre_price_idx'),
+            models.Index(fields=['author', 'created_at'], name='book_author_created_idx'),
+            models.Index(fields=['price'], name='book_price_idx'),
+            models.Index(fields=['average_rating'], name='book_rating_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the signals can move author/genre counters when a book is reassigned
+        loaded = dict(zip(field_names, values))
+        instance._loaded_relations = (loaded.get('author_id'), loaded.get('genre_id'))
+        return instance
+
+    @property
     def total_reviews(self):
-        return self.ratings.count()
+        return self.rating_count
 
     def __str__(self):
         return self.title
 
+# Search document, one row per book, denormalized for the full-text index (see store/search.py)
+class BookSearchDocument(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    author = models.CharField(max_length=255)
+    genre = models.CharField(max_length=30)
+
+    def __str__(self):
+        return self.title
+
+# Star-rating breakdown, one row per reviewed book, kept in step with Review by store.signals
+class RatingHistogramQuerySet(models.QuerySet):
+    def adjust(self, book_id, score, delta):
+        """Move one bucket by delta, creating the book's all-zero row first for an increment."""
+        bucket = f'stars_{score}'
+        # A missing row on a decrement means the book is being deleted (the row cascades first)
+        if not self.filter(book_id=book_id).update(**{bucket: F(bucket) + delta}) and delta > 0:
+            # Not a rebuild: two concurrent first reviews would each count only their own.
+            # Both insert-or-ignore the same zero row, then both deltas land on it.
+            self.bulk_create([BookRatingHistogram(book_id=book_id)], ignore_conflicts=True)
+            self.filter(book_id=book_id).update(**{bucket: F(bucket) + delta})
+
+    def rebuild(self, books):
+        """Recompute the histograms of the given Book queryset from the Review table."""
+        counts = defaultdict(dict)
+        rows = Review.objects.filter(book__in=books).order_by().values_list('book_id', 'score').annotate(n=Count('id'))
+        for book_id, score, n in rows:
+            counts[book_id][f'stars_{score}'] = n
+        histograms = [
+            BookRatingHistogram(book_id=book_id, **buckets) for book_id, buckets in counts.items()
+        ]
+        self.bulk_create(
+            histograms, update_conflicts=True, update_fields=BookRatingHistogram.BUCKETS,
+            unique_fields=['book'] if connection.features.supports_update_conflicts_with_target else None,
+        )
+        # Books whose last review is gone
+        self.filter(book__in=books).exclude(book_id__in=list(counts)).delete()
+        return len(histograms)
+
+
+class BookRatingHistogram(models.Model):
+    BUCKETS = ['stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5']
+
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='rating_histogram')
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    objects = RatingHistogramQuerySet.as_manager()
+
+    def as_dict(self):
+        return {str(score): getattr(self, f'stars_{score}') for score in range(1, 6)}
+
 # Review Model
 class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, related_name="ratings", on_delete=models.CASCADE)
     score = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     description = models.TextField()
-    image = models.ImageField(upload_to='review_img/', validators=[validate_image_file_size], null=True, blank=True)
+    image = models.ImageField(upload_to='review_img/', storage=media_storage, validators=[validate_review_image], null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('user', 'book')
+        # Newest-first keyset pages of one book's reviews (CreatedAtCursorPagination)
+        indexes = [models.Index(fields=['book', 'created_at'], name='review_book_created_idx')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        # Remembered so the signals can fix up the book a review moves away from
+        # and move the histogram bucket when its book or score changes
+        instance._loaded_book_id = loaded.get('book_id')
+        instance._loaded_score = loaded.get('score')
+        return instance
+
+    # Atomic so the signal-maintained rating columns and histogram commit with the review
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_book_id, self._loaded_score = self.book_id, self.score
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"Review for {self.book.title} by {self.user.username}"
@@ -134,9 +277,83 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
 
 # Cart Model
+MONEY = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_summary(self):
+        """Annotate total_price, item_count and total_quantity computed in SQL."""
+        line_total = ExpressionWrapper(F('items__quantity') * F('items__book__price'), output_field=MONEY)
+        return self.annotate(
+            total_price=Coalesce(Sum(line_total), Value(Decimal('0.00')), output_field=MONEY),
+            item_count=Count('items'),
+            total_quantity=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+
+    def with_totals(self):
+        """with_summary() plus the items, each annotated with its line total."""
+        items = CartItem.objects.with_total_price().select_related('book')
+        return self.with_summary().prefetch_related(Prefetch('items', queryset=items))
+
+    def touch(self):
+        """Mark the carts as active now; called after every cart item write."""
+        return self.update(last_activity=timezone.now())
+
+    def abandoned(self, ttl):
+        """Carts with no item writes for longer than the ttl timedelta."""
+        return self.filter(last_activity__lt=timezone.now() - ttl)
+
+
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Indexed for reap_abandoned_carts, which walks it oldest first
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = CartQuerySet.as_manager()
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_total_price(self):
+        return self.annotate(
+            total_price=ExpressionWrapper(F('quantity') * F('book__price'), output_field=MONEY)
+        )
+
+    def add_quantity(self, cart_id, book_id, quantity):
+        """
+        Insert the item or add `quantity` to the existing row in one statement.
+
+        The row is selected from the cart and book tables, so an unknown id
+        inserts nothing and None is returned instead of a FK error.
+        """
+        table = CartItem._meta.db_table
+        db_cart_id = Cart._meta.pk.get_db_prep_value(cart_id, connection)
+        select = (
+            f'INSERT INTO {table} (cart_id, book_id, quantity) '
+            f'SELECT c.id, b.id, %s FROM {Cart._meta.db_table} c, {Book._meta.db_table} b '
+            f'WHERE c.id = %s AND b.id = %s '
+        )
+        params = [quantity, db_cart_id, book_id]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(
+                    # Qualified: the SELECT's cart and book tables have id columns too
+                    select + f'ON DUPLICATE KEY UPDATE {table}.id = LAST_INSERT_ID({table}.id), '
+                    f'{table}.quantity = {table}.quantity + %s',
+                    params + [quantity]
+                )
+                if not cursor.rowcount:
+                    return None
+                return self.get(pk=cursor.lastrowid)
+            cursor.execute(
+                select + f'ON CONFLICT (cart_id, book_id) DO UPDATE '
+                f'SET quantity = {table}.quantity + excluded.quantity RETURNING id, quantity',
+                params
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return CartItem(id=row[0], cart_id=cart_id, book_id=book_id, quantity=row[1])
 
 
 class CartItem(models.Model):
@@ -144,5 +361,7 @@ class CartItem(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [['cart', 'book']]
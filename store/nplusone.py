@@ -0,0 +1,171 @@
+"""
+N+1 query detection for development, staging and tests.
+
+NPlusOneDetector is an execute wrapper. While one is active (a ContextVar,
+so it follows a request into sync_to_async threads), record_select hands it
+every statement on every connection. It groups a request's SELECTs by
+fingerprint (see store.metrics.fingerprint). Any pattern repeated
+NPLUSONE_THRESHOLD times or more is reported, typically the per-object
+``WHERE id = %s`` lookups a SerializerMethodField or model property makes.
+Each repetition is attributed by walking the stack to:
+- the serializer field being rendered;
+- the innermost project frame that issued the query, e.g.
+  ``AuthorSerializer.get_total_books`` or ``Book.average_rating``.
+
+NPLUSONE_MODE picks what happens: 'raise' fails the request (the test
+runner below sets it for the whole suite), 'log' warns (staging, DEBUG), and
+None turns the middleware off. The stack walks make this too slow for
+production traffic.
+"""
+import logging
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from rest_framework.serializers import BaseSerializer
+from . import metrics
+from .metrics import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Execute wrappers of our own that sit between the query and its caller
+INSTRUMENTATION_FILES = {__file__, metrics.__file__}
+
+
+_active = ContextVar('store_nplusone_detector', default=None)
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class QueryPattern:
+    def __init__(self):
+        self.count = 0
+        self.origins = Counter()
+
+
+class NPlusOneDetector:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.patterns = {}
+        self.base_dir = str(settings.BASE_DIR) + '/'
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            pattern = self.patterns.setdefault(fingerprint(sql), QueryPattern())
+            pattern.count += 1
+            pattern.origins[self.origin(sys._getframe(1))] += 1
+        return execute(sql, params, many, context)
+
+    def origin(self, frame):
+        """(serializer field, issuing project frame) for the query being executed."""
+        field = caller = None
+        while frame is not None and not (field and caller):
+            code = frame.f_code
+            if field is None and code.co_name == 'to_representation':
+                serializer, current = frame.f_locals.get('self'), frame.f_locals.get('field')
+                # Serializer.to_representation's loop variable is the field being rendered
+                if isinstance(serializer, BaseSerializer) and current is not None:
+                    field = f'{type(serializer).__name__}.{current.field_name}'
+            if caller is None and self.is_project_code(code.co_filename):
+                owner = frame.f_locals.get('self')
+                name = f'{type(owner).__name__}.{code.co_name}' if owner is not None else code.co_name
+                caller = f'{name} ({code.co_filename.removeprefix(self.base_dir)}:{frame.f_lineno})'
+            frame = frame.f_back
+        return field, caller
+
+    def is_project_code(self, filename):
+        return (
+            filename.startswith(self.base_dir)
+            and 'site-packages' not in filename
+            and filename not in INSTRUMENTATION_FILES
+        )
+
+    def problems(self):
+        return {
+            fp: pattern for fp, pattern in self.patterns.items()
+            # A repeated IN (...) batch is a prefetch, not a per-object lookup
+            if pattern.count >= self.threshold and ' IN (' not in fp
+        }
+
+    def report(self):
+        lines = []
+        for fp, pattern in sorted(self.problems().items(), key=lambda item: -item[1].count):
+            lines.append(f'{pattern.count}x {fp[:300]}')
+            for (field, caller), count in pattern.origins.most_common(3):
+                lines.append(f'    {count}x from {field or "(no serializer field)"} via {caller or "(library code)"}')
+        return '\n'.join(lines)
+
+
+def record_select(execute, sql, params, many, context):
+    detector = _active.get()
+    if detector is None:
+        return execute(sql, params, many, context)
+    return detector(execute, sql, params, many, context)
+
+
+def install_select_recorder(sender, connection, **kwargs):
+    """connection_created receiver: wrap every new connection once."""
+    if record_select not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_select)
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None):
+    """Record the queries run inside the block on every database; yields the detector."""
+    detector = NPlusOneDetector(threshold or getattr(settings, 'NPLUSONE_THRESHOLD', 5))
+    # Connections created before the receiver was connected
+    for alias in connections:
+        install_select_recorder(None, connections[alias])
+    token = _active.set(detector)
+    try:
+        yield detector
+    finally:
+        _active.reset(token)
+
+
+class NPlusOneMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if getattr(settings, 'NPLUSONE_MODE', None) not in ('raise', 'log'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with detect_n_plus_one() as detector:
+            response = self.get_response(request)
+        return self.check(request, response, detector)
+
+    async def __acall__(self, request):
+        with detect_n_plus_one() as detector:
+            response = await self.get_response(request)
+        return self.check(request, response, detector)
+
+    def check(self, request, response, detector):
+        if detector.problems():
+            message = f'N+1 queries in {request.method} {request.path}:\n{detector.report()}'
+            if settings.NPLUSONE_MODE == 'raise':
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """Runs the suite with NPLUSONE_MODE = NPLUSONE_TEST_MODE (default 'raise')."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_MODE = getattr(settings, 'NPLUSONE_TEST_MODE', 'raise')
@@ -0,0 +1,145 @@
+import json
+from base64 import b64decode, b64encode
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_filter(ordering, position):
+    """
+    Rows strictly after ``position`` (one value per field) in ``ordering``.
+
+    For ``['price', 'id']`` this is ``(price, id) > (%s, %s)``, written as
+    ``price >= %s AND (price > %s OR (price = %s AND id > %s))`` so the
+    leading column is a single index range on every backend; ``-`` fields
+    compare the other way.
+    """
+    def compare(term, value):
+        name = term.lstrip('-')
+        return Q(**{f"{name}__{'lt' if term.startswith('-') else 'gt'}": value})
+
+    after = compare(ordering[-1], position[-1])
+    for term, value in reversed(list(zip(ordering[:-1], position[:-1]))):
+        after = compare(term, value) | (Q(**{term.lstrip('-'): value}) & after)
+    bound = Q(**{f"{ordering[0].lstrip('-')}__{'lte' if ordering[0].startswith('-') else 'gte'}": position[0]})
+    return bound & after
+
+
+def keyset_position(instance, ordering):
+    return [getattr(instance, term.lstrip('-')) for term in ordering]
+
+
+def keyset_chunks(queryset, ordering, chunk_size):
+    """
+    Yield ``queryset`` in ``ordering`` as lists of up to ``chunk_size`` rows.
+
+    Each chunk is its own ``LIMIT`` query continuing after the previous
+    chunk's last row. Unlike .iterator(), this keeps memory bounded on MySQL,
+    where mysqlclient buffers a whole result set client-side.
+    """
+    queryset = queryset.order_by(*ordering)
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = keyset_filter(ordering, keyset_position(chunk[-1], ordering))
+        chunk = list(queryset.filter(after)[:chunk_size])
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the whole ordering, not just its first field.
+
+    DRF's CursorPagination keeps only ordering[0] in the cursor and steps
+    over ties with an OFFSET capped at offset_cutoff. Paging a column with
+    many equal values (price, average_rating) scans each tie group, and it
+    loops once a group is larger than the cutoff. Here the cursor holds the
+    boundary row's value for every ordering field, and the next page is
+    ``WHERE (col, id) > (%s, %s)`` (see keyset_filter). The ordering must be
+    on non-null fields and end with a unique one (id).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        reverse, position = self.decode_cursor(request) or (False, None)
+
+        ordering = [self.flip(term) for term in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        # A cursor was followed, so there are rows on the side it came from
+        self.position = position
+        self.has_next = position is not None if reverse else more
+        self.has_previous = more if reverse else position is not None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    @staticmethod
+    def flip(term):
+        return term[1:] if term.startswith('-') else f'-{term}'
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = keyset_position(self.page[-1], self.ordering) if self.page else self.position
+        return self.encode_cursor((False, position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = keyset_position(self.page[0], self.ordering) if self.page else self.position
+        return self.encode_cursor((True, position))
+
+    def encode_cursor(self, cursor):
+        reverse, position = cursor
+        data = {'p': [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in position]}
+        if reverse:
+            data['r'] = 1
+        encoded = b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode(), validate=True))
+            fields = [self.model._meta.get_field(term.lstrip('-')) for term in self.ordering]
+            if len(data['p']) != len(fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(fields, data['p'])]
+        except (ValueError, TypeError, KeyError, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(data.get('r')), position
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    The page size defaults to REST_FRAMEWORK['PAGE_SIZE'] and can be
+    changed per request with ?page_size= up to max_page_size.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    # For models without a created_at column (e.g. Customer)
+    ordering = ('-id',)
@@ -0,0 +1,107 @@
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import Book, BookSearchDocument
+
+MAX_TERMS = 8
+FTS_TABLE = 'store_booksearch_fts'
+
+
+class SearchBackend:
+    """
+    Fallback engine for databases without a full-text index. Engines only
+    rank; the documents themselves are maintained by index_books().
+    """
+
+    def tokenize(self, query):
+        return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+    def search(self, query, limit):
+        """Return up to `limit` book ids, best match first."""
+        docs = BookSearchDocument.objects.all()
+        for term in self.tokenize(query):
+            docs = docs.filter(Q(title__icontains=term) | Q(author__icontains=term) | Q(genre__icontains=term))
+        return list(docs.order_by('title').values_list('book_id', flat=True)[:limit])
+
+
+class SQLiteFTSBackend(SearchBackend):
+    # Column weights: title, description, author, genre
+    weights = (10.0, 1.0, 5.0, 3.0)
+
+    def search(self, query, limit):
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(map(str, self.weights))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLFullTextBackend(SearchBackend):
+    def search(self, query, limit):
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+        match = ' '.join(f'+{term}*' for term in terms)
+        against = 'MATCH(title, description, author, genre) AGAINST (%s IN BOOLEAN MODE)'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT book_id FROM {BookSearchDocument._meta.db_table} '
+                f'WHERE {against} ORDER BY {against} DESC LIMIT %s',
+                [match, match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'mysql': MySQLFullTextBackend,
+}
+
+
+def get_backend():
+    path = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def index_books(books, batch_size=500):
+    """Upsert search documents for the given Book queryset in batches."""
+    rows = books.order_by().values_list('id', 'title', 'description', 'author__title', 'genre__title')
+    batch = []
+    indexed = 0
+    for book_id, title, description, author, genre in rows.iterator(chunk_size=batch_size):
+        batch.append(BookSearchDocument(
+            book_id=book_id, title=title, description=description, author=author, genre=genre
+        ))
+        if len(batch) >= batch_size:
+            indexed += _write_batch(batch)
+            batch = []
+    if batch:
+        indexed += _write_batch(batch)
+    return indexed
+
+
+def _write_batch(batch):
+    BookSearchDocument.objects.bulk_create(
+        batch, update_conflicts=True, update_fields=['title', 'description', 'author', 'genre'],
+        # MySQL's ON DUPLICATE KEY UPDATE has no conflict target
+        unique_fields=['book'] if connection.features.supports_update_conflicts_with_target else None,
+    )
+    return len(batch)
+
+
+def search_books(query, limit=20):
+    """Return Book instances ranked by relevance."""
+    ids = get_backend().search(query, limit)
+    books = Book.objects.select_related('author', 'genre').in_bulk(ids)
+    return [books[pk] for pk in ids if pk in books]
@@ -1,49 +1,79 @@
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from uuid import uuid4
-from .models import Genre, Book, Author, Customer, Order, Review, Cart, CartItem
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Case, When, Value, F, Sum, Subquery, OuterRef, ExpressionWrapper
+from .cache import bump_version
+from .images import variant_urls
+from .validation import validate_cover_image, validate_author_image, validate_review_image
+from .models import Genre, Book, Author, Customer, Address, Order, OrderItem, Review, Cart, CartItem, MONEY
+
+class ImageVariantsField(serializers.Field):
+    """Read-only URLs of the resized derivatives of an ImageField (see store/images.py)."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        urls = variant_urls(value)
+        if request is not None:
+            urls = {
+                variant: {ext: request.build_absolute_uri(url) for ext, url in formats.items()}
+                for variant, formats in urls.items()
+            }
+        return urls
 
 class GenraSerializer(serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ['id', 'title', 'product_count']
 
-    product_count = serializers.IntegerField(read_only=True)
+    product_count = serializers.IntegerField(source='book_count', read_only=True)
 
 class AuthorSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(use_url=True)
+    # FileField + header-only validator instead of ImageField, which verifies the whole upload with Pillow
+    image = serializers.FileField(use_url=True, validators=[validate_author_image])
+    image_variants = ImageVariantsField(source='image')
     short_bio = serializers.SerializerMethodField()
-    total_books = serializers.SerializerMethodField()
+    total_books = serializers.IntegerField(source='book_count', read_only=True)
 
     class Meta:
         model = Author
-        fields = ['id', 'title', 'bio', 'short_bio', 'total_books', 'image', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'bio', 'short_bio', 'total_books', 'image', 'image_variants', 'created_at', 'updated_at']
 
     def get_short_bio(self, obj):
         return obj.bio[:100] + "..." if len(obj.bio) > 100 else obj.bio
-    
-    def get_total_books(self, obj):
-        return obj.books.count()
 
 class BookSerializer(serializers.ModelSerializer):
-    author_name = serializers.CharField(source='Genre.title', read_only=True)
-    genre_name = serializers.CharField(source='Genre.title', read_only=True)
+    author_name = serializers.CharField(source='author.title', read_only=True)
+    genre_name = serializers.CharField(source='genre.title', read_only=True)
     average_rating = serializers.FloatField(read_only=True)
     total_reviews = serializers.IntegerField(read_only=True)
-    #cover_image = serializers.SerializerMethodField()
+    cover_image = serializers.FileField(required=False, allow_null=True, validators=[validate_cover_image])
+    cover_variants = ImageVariantsField(source='cover_image')
 
     class Meta:
         model = Book
         fields = [
             'id', 'title', 'description', 'stock', 'isbn', 'price',
-            'author', 'author_name', 'genre', 'genre_name', 'cover_image',
+            'author', 'author_name', 'genre', 'genre_name', 'cover_image', 'cover_variants',
             'average_rating', 'total_reviews', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
     
 class ReviewSerializer(serializers.ModelSerializer):
+    image = serializers.FileField(required=False, allow_null=True, validators=[validate_review_image])
+    # ReviewViewSet joins the user in
+    user_name = serializers.CharField(source='user.username', read_only=True)
+
     class Meta:
         model = Review
-        fields = ['id', 'user', 'book', 'description', 'score', 'image','created_at']
+        fields = ['id', 'user', 'user_name', 'book', 'description', 'score', 'image','created_at']
         read_only_fields = ['user', 'book', 'created_at']
 
     def create(self, validated_data):
@@ -54,7 +84,7 @@ class ReviewSerializer(serializers.ModelSerializer):
             defaults={
                 'score': validated_data['score'],
                 'description': validated_data['description'],
-                'image': validated_data['image'],
+                'image': validated_data.get('image'),
             }
         )
         
@@ -84,10 +114,8 @@ class SimpleProductSerializer(serializers.ModelSerializer):
 
 class CartItemSerializer(serializers.ModelSerializer):
     book = SimpleProductSerializer()
-    total_price = serializers.SerializerMethodField()
-
-    def get_total_price(self, cart_item: CartItem):
-        return cart_item.quantity * cart_item.book.price
+    # Annotated by CartItem.objects.with_total_price()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
@@ -97,41 +125,41 @@ class CartItemSerializer(serializers.ModelSerializer):
 class CartSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField()
-
-    def get_total_price(self, cart):
-        return sum([item.quantity * item.book.price for item in cart.items.all()])
+    # Annotated by Cart.objects.with_totals(); a freshly created cart has no items
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, default=Decimal('0.00'))
 
     class Meta:
         model = Cart
         fields = ['id', 'items', 'total_price']
 
 
+class CartSummarySerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+    # Annotated by Cart.objects.with_summary()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    total_quantity = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = ['id', 'item_count', 'total_quantity', 'total_price']
+
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     book_id = serializers.IntegerField()
 
-    def validate_book_id(self, value):
-        if not Book.objects.filter(pk=value).exists():
-            raise serializers.ValidationError(
-                'No book with the given ID was found.'
-            )
-        return value
-
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         book_id = self.validated_data['book_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, book_id=book_id
-            )
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data
+        # Single INSERT ... ON CONFLICT/ON DUPLICATE KEY, safe against concurrent adds
+        self.instance = CartItem.objects.add_quantity(cart_id, book_id, quantity)
+        if self.instance is None:
+            if not Cart.objects.filter(pk=cart_id).exists():
+                raise NotFound('No cart with the given ID was found.')
+            raise serializers.ValidationError(
+                {'book_id': ['No book with the given ID was found.']}
             )
 
         return self.instance
@@ -147,8 +175,135 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         fields = ['quantity']
 
 
-    
+# Upper bound of CartItem.quantity (a PositiveSmallIntegerField) on every backend
+MAX_QUANTITY = 32767
 
-    
 
-    
+class BatchCartItemLineSerializer(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+
+
+class BatchCartItemSerializer(serializers.Serializer):
+    """
+    Apply many cart changes at once: `add` increments, `update` sets the
+    quantity and `remove` deletes, in that order.
+    """
+    add = BatchCartItemLineSerializer(many=True, required=False)
+    update = BatchCartItemLineSerializer(many=True, required=False)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        # No default=list on the fields: drf_yasg cannot render a default on a nested many=True serializer
+        attrs = {name: attrs.get(name, []) for name in ('add', 'update', 'remove')}
+        book_ids = {line['book_id'] for line in attrs['add'] + attrs['update']}
+        found = set(Book.objects.filter(pk__in=book_ids).values_list('id', flat=True))
+        missing = sorted(book_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                {'book_id': [f'No book with the given ID was found: {missing}']}
+            )
+        return attrs
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        data = self.validated_data
+        touched = {line['book_id'] for line in data['add'] + data['update']} | set(data['remove'])
+
+        with transaction.atomic():
+            # Serializes batches on one cart, so two of them cannot both insert the same new book
+            Cart.objects.select_for_update().filter(pk=cart_id).exists()
+            items = {
+                item.book_id: item
+                for item in CartItem.objects.select_for_update().filter(cart_id=cart_id, book_id__in=touched)
+            }
+            new_items = {}
+            for line in data['add']:
+                item = items.get(line['book_id']) or new_items.get(line['book_id'])
+                if item:
+                    item.quantity += line['quantity']
+                else:
+                    new_items[line['book_id']] = CartItem(cart_id=cart_id, **line)
+            for line in data['update']:
+                item = items.get(line['book_id']) or new_items.get(line['book_id'])
+                if item:
+                    item.quantity = line['quantity']
+                else:
+                    new_items[line['book_id']] = CartItem(cart_id=cart_id, **line)
+            for book_id in data['remove']:
+                new_items.pop(book_id, None)
+                items.pop(book_id, None)
+
+            too_many = sorted(
+                book_id for book_id, item in (items | new_items).items() if item.quantity > MAX_QUANTITY
+            )
+            if too_many:
+                raise serializers.ValidationError(
+                    {'quantity': [f'Quantity would exceed {MAX_QUANTITY} for books: {too_many}']}
+                )
+
+            CartItem.objects.filter(cart_id=cart_id, book_id__in=data['remove']).delete()
+            CartItem.objects.bulk_update(items.values(), ['quantity'])
+            # Upsert in case a single-item add (add_quantity) inserted the book meanwhile
+            CartItem.objects.bulk_create(
+                new_items.values(), update_conflicts=True, update_fields=['quantity'],
+                unique_fields=['cart', 'book'] if connection.features.supports_update_conflicts_with_target else None
+            )
+
+        return Cart.objects.with_totals().get(pk=cart_id)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """
+    Turn a cart into an Order: lock its books in id order, decrement stock
+    with one conditional UPDATE, bulk insert the order items, total the
+    order in SQL and delete the cart.
+    """
+    shipping_address_id = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_shipping_address_id(self, value):
+        if value is not None and not Address.objects.filter(pk=value, customer=self.context['customer']).exists():
+            raise serializers.ValidationError('No address with the given ID was found.')
+        return value
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        customer = self.context['customer']
+
+        with transaction.atomic():
+            # Lock the cart first so the same cart can't be checked out twice
+            if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+                raise NotFound('No cart with the given ID was found.')
+            quantities = dict(CartItem.objects.filter(cart_id=cart_id).values_list('book_id', 'quantity'))
+            if not quantities:
+                raise serializers.ValidationError({'cart': ['The cart is empty.']})
+
+            # Consistent lock order (by id) keeps concurrent checkouts from deadlocking
+            books = list(
+                Book.objects.select_for_update().filter(pk__in=quantities).order_by('id').values_list('id', 'price', 'stock')
+            )
+            short = [book_id for book_id, _, stock in books if stock < quantities[book_id]]
+            if short:
+                raise serializers.ValidationError({'book_id': [f'Not enough stock for books: {short}']})
+
+            wanted = Case(*[When(pk=book_id, then=Value(quantity)) for book_id, quantity in quantities.items()])
+            updated = Book.objects.filter(pk__in=quantities, stock__gte=wanted).update(stock=F('stock') - wanted)
+            if updated != len(quantities):
+                raise serializers.ValidationError({'book_id': ['Not enough stock.']})
+
+            order = Order.objects.create(
+                customer=customer, shipping_address_id=self.validated_data.get('shipping_address_id')
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, book_id=book_id, quantity=quantities[book_id], unit_price=price)
+                for book_id, price, _ in books
+            ])
+            line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=MONEY)
+            totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(total=Sum(line_total)).values('total')
+            Order.objects.filter(pk=order.pk).update(total_amount=Subquery(totals))
+            Cart.objects.filter(pk=cart_id).delete()
+            # Stock changed through update(), which skips the signals that invalidate cached books
+            transaction.on_commit(lambda: bump_version('book'))
+
+        order.refresh_from_db()
+        return order
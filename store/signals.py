@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_version
+from .models import Genre, Author, Book, Review, BookSearchDocument, BookRatingHistogram
+from .images import schedule_variants
+from .search import index_books
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_book_rating(sender, instance, **kwargs):
+    # Covers ReviewSerializer.create (update_or_create), admin edits and deletes.
+    # A review moved to another book (ReviewAdmin) also refreshes the book it left.
+    book_ids = {instance.book_id, getattr(instance, '_loaded_book_id', None)} - {None}
+    Book.objects.filter(pk__in=book_ids).refresh_rating_aggregates()
+    bump_version('book')
+
+
+@receiver(post_save, sender=Review)
+def update_rating_histogram(sender, instance, created, **kwargs):
+    # A review that changed score or moved to another book leaves its old (book, score) bucket
+    old = None if created else (getattr(instance, '_loaded_book_id', None), getattr(instance, '_loaded_score', None))
+    if created or (old and all(old) and old != (instance.book_id, instance.score)):
+        BookRatingHistogram.objects.adjust(instance.book_id, instance.score, 1)
+        if old:
+            BookRatingHistogram.objects.adjust(*old, -1)
+
+
+@receiver(post_delete, sender=Review)
+def decrement_rating_histogram(sender, instance, **kwargs):
+    BookRatingHistogram.objects.adjust(instance.book_id, instance.score, -1)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    # Authors and genres expose book counts
+    bump_version('book', 'author', 'genre')
+
+
+@receiver(post_save, sender=Book)
+def update_book_counts(sender, instance, created, **kwargs):
+    old_author, old_genre = (None, None) if created else getattr(instance, '_loaded_relations', (None, None))
+    if created or (old_author and old_author != instance.author_id):
+        Author.objects.adjust_book_count(instance.author_id, 1)
+        if old_author:
+            Author.objects.adjust_book_count(old_author, -1)
+    if created or (old_genre and old_genre != instance.genre_id):
+        Genre.objects.adjust_book_count(instance.genre_id, 1)
+        if old_genre:
+            Genre.objects.adjust_book_count(old_genre, -1)
+    instance._loaded_relations = (instance.author_id, instance.genre_id)
+
+
+@receiver(post_delete, sender=Book)
+def decrement_book_counts(sender, instance, **kwargs):
+    Author.objects.adjust_book_count(instance.author_id, -1)
+    Genre.objects.adjust_book_count(instance.genre_id, -1)
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    index_books(Book.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_cache(sender, instance, **kwargs):
+    # Books expose author_name
+    bump_version('author', 'book')
+
+
+@receiver(post_save, sender=Author)
+def reindex_author_books(sender, instance, **kwargs):
+    BookSearchDocument.objects.filter(book__author=instance).update(author=instance.title)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genre_cache(sender, instance, **kwargs):
+    # Books expose genre_name
+    bump_version('genre', 'book')
+
+
+@receiver(post_save, sender=Genre)
+def reindex_genre_books(sender, instance, **kwargs):
+    BookSearchDocument.objects.filter(book__genre=instance).update(genre=instance.title)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Review)
+def generate_image_variants(sender, instance, **kwargs):
+    field_file = instance.cover_image if sender is Book else instance.image
+    if field_file:
+        transaction.on_commit(lambda: schedule_variants(field_file, sender._meta.model_name))
@@ -1,3 +1,1458 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from threading import Thread
+from unittest import mock
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, OperationalError
+from django.http import JsonResponse
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core import schema
+from . import metrics
+from .images import generate_variants, variant_name
+from .catalog import export_catalog
+from .search import search_books
+from .storage import media_storage
+from .models import Genre, Author, Book, BookRatingHistogram, Review, Cart, CartItem, Customer, Order
+from .nplusone import NPlusOneError, detect_n_plus_one
+from .serializers import AuthorSerializer, BatchCartItemSerializer
+from .validation import validate_cover_image, validate_cover_image_size, validate_author_image_size
 
-# Create your tests here.
+
+class QueryBudgetMixin:
+    def assertMaxQueries(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(ctx.captured_queries), budget,
+            '\n'.join(q['sql'] for q in ctx.captured_queries)
+        )
+        return result, len(ctx.captured_queries)
+
+
+class BookQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_books(self, count):
+        books = []
+        start = Book.objects.count()
+        for i in range(start, start + count):
+            author = Author.objects.create(title=f'Author {i}', bio='Bio')
+            genre = Genre.objects.create(title=f'Genre {i}')
+            book = Book.objects.create(
+                title=f'Book {i}', description='Desc', stock=5, price='9.99',
+                author=author, genre=genre
+            )
+            Review.objects.create(user=self.user, book=book, score=4, description='Good')
+            books.append(book)
+        return books
+
+    def test_book_list_query_count_is_constant(self):
+        self.create_books(2)
+        response, small = self.assertMaxQueries(1, self.client.get, '/store/books/')
+        self.assertEqual(response.status_code, 200)
+
+        self.create_books(20)
+        response, large = self.assertMaxQueries(1, self.client.get, '/store/books/')
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(small, large)
+
+    def test_book_list_exposes_related_names_and_ratings(self):
+        book = self.create_books(1)[0]
+        response = self.client.get('/store/books/')
+        row = next(r for r in response.json()['results'] if r['id'] == book.id)
+        self.assertEqual(row['author_name'], book.author.title)
+        self.assertEqual(row['genre_name'], book.genre.title)
+        self.assertEqual(row['average_rating'], 4.0)
+        self.assertEqual(row['total_reviews'], 1)
+
+    def test_book_retrieve_query_budget(self):
+        book = self.create_books(1)[0]
+        response, _ = self.assertMaxQueries(1, self.client.get, f'/store/books/{book.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_nested_review_list_query_budget(self):
+        book = self.create_books(1)[0]
+        for i in range(10):
+            user = User.objects.create_user(username=f'user{i}', password='secret')
+            Review.objects.create(user=user, book=book, score=3, description='Ok')
+        response, _ = self.assertMaxQueries(1, self.client.get, f'/store/books/{book.id}/review/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 11)
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.other = User.objects.create_user(username='critic', password='secret')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.book = Book.objects.create(title='Book', description='D', stock=1, price='4.00', author=author, genre=genre)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/store/books/{self.book.id}/review/'
+
+    def assertRating(self, rating_sum, rating_count, average_rating):
+        self.book.refresh_from_db()
+        self.assertEqual(
+            (self.book.rating_sum, self.book.rating_count, self.book.average_rating),
+            (rating_sum, rating_count, Decimal(average_rating)),
+        )
+
+    def test_aggregates_follow_creates_score_changes_and_deletes(self):
+        self.assertRating(0, 0, '0')
+        self.assertEqual(self.client.post(self.url, {'score': 5, 'description': 'Great'}).status_code, 201)
+        Review.objects.create(user=self.other, book=self.book, score=2, description='Meh')
+        self.assertRating(7, 2, '3.5')
+
+        # ReviewSerializer.create is an update_or_create on (user, book)
+        self.client.post(self.url, {'score': 3, 'description': 'Changed my mind'})
+        self.assertRating(5, 2, '2.5')
+
+        review = Review.objects.get(user=self.user)
+        self.assertEqual(self.client.delete(f'{self.url}{review.id}/').status_code, 204)
+        self.assertRating(2, 1, '2')
+        Review.objects.get(user=self.other).delete()
+        self.assertRating(0, 0, '0')
+
+    def test_moving_a_review_updates_both_books(self):
+        review = Review.objects.create(user=self.user, book=self.book, score=4, description='Good')
+        other = Book.objects.create(
+            title='Other', description='D', stock=1, price='4.00', author=self.book.author, genre=self.book.genre
+        )
+        review = Review.objects.get(pk=review.pk)
+        review.book = other
+        review.save()
+        self.assertRating(0, 0, '0')
+        other.refresh_from_db()
+        self.assertEqual((other.rating_sum, other.rating_count), (4, 1))
+
+        review.score = 2
+        review.save()
+        histograms = {h.book_id: h for h in BookRatingHistogram.objects.all()}
+        self.assertEqual((histograms[self.book.id].stars_4, histograms[self.book.id].stars_2), (0, 0))
+        self.assertEqual((histograms[other.id].stars_4, histograms[other.id].stars_2), (0, 1))
+
+    def test_rebuild_command_repairs_drift(self):
+        Review.objects.create(user=self.user, book=self.book, score=4, description='Good')
+        Review.objects.create(user=self.other, book=self.book, score=5, description='Great')
+        Book.objects.filter(pk=self.book.pk).update(rating_sum=0, rating_count=9, average_rating=1)
+
+        out = StringIO()
+        call_command('rebuild_rating_aggregates', book_ids=[self.book.id], stdout=out)
+        self.assertIn('1 book(s)', out.getvalue())
+        self.assertRating(9, 2, '4.5')
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        Book.objects.bulk_create([
+            Book(title=f'Book {i}', description='Desc', stock=1, price='5.00', author=author, genre=genre)
+            for i in range(7)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_walks_every_book_once_newest_first(self):
+        seen = []
+        url = '/store/books/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 3)
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        expected = list(Book.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_size_override_returns_single_page(self):
+        response = self.client.get('/store/books/?page_size=1000')
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertIsNone(response.json()['next'])
+
+
+class VersionedCacheTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.author = Author.objects.create(title='Author', bio='Bio')
+        cls.genre = Genre.objects.create(title='Fiction')
+        cls.book = Book.objects.create(
+            title='Book', description='Desc', stock=1, price='5.00', author=cls.author, genre=cls.genre
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/store/books/{self.book.id}/'
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        second, _ = self.assertMaxQueries(0, self.client.get, self.url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response, _ = self.assertMaxQueries(0, self.client.get, self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_related_write_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.author.title = 'Renamed'
+        self.author.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['author_name'], 'Renamed')
+
+    def test_review_write_invalidates(self):
+        self.client.get(self.url)
+        Review.objects.create(user=self.user, book=self.book, score=5, description='Great')
+        self.assertEqual(self.client.get(self.url).json()['total_reviews'], 1)
+
+
+class BookSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.tolkien = Author.objects.create(title='Tolkien', bio='Bio')
+        cls.fantasy = Genre.objects.create(title='Fantasy')
+        cls.hobbit = Book.objects.create(
+            title='The Hobbit', description='A journey there and back again', stock=1,
+            price='5.00', author=cls.tolkien, genre=cls.fantasy
+        )
+        cls.other = Book.objects.create(
+            title='Dragons of Autumn', description='Mentions the hobbit once', stock=1,
+            price='5.00', author=Author.objects.create(title='Weis', bio='Bio'), genre=cls.fantasy
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        response = self.client.get('/store/books/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.search('hobbit'), [self.hobbit.id, self.other.id])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('hob'), [self.hobbit.id, self.other.id])
+        self.assertEqual(self.search('tolk'), [self.hobbit.id])
+
+    def test_index_follows_saves(self):
+        self.tolkien.title = 'J. R. R. Tolkien'
+        self.tolkien.save()
+        self.hobbit.title = 'There and Back Again'
+        self.hobbit.save()
+        self.assertEqual(self.search('tolkien back'), [self.hobbit.id])
+        self.hobbit.delete()
+        self.assertEqual(self.search('tolkien'), [])
+
+    def test_query_is_required(self):
+        response = self.client.get('/store/books/search/')
+        self.assertEqual(response.status_code, 400)
+
+
+class AddCartItemTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='secret')
+        cls.book = Book.objects.create(
+            title='Book', description='Desc', stock=10, price='5.00',
+            author=Author.objects.create(title='Author', bio='Bio'),
+            genre=Genre.objects.create(title='Fiction')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.url = f'/store/carts/{self.cart.id}/items/'
+
+    def test_repeated_add_increments_quantity(self):
+        first = self.client.post(self.url, {'book_id': self.book.id, 'quantity': 2})
+        second = self.client.post(self.url, {'book_id': self.book.id, 'quantity': 3})
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.json(), {'id': first.json()['id'], 'book_id': self.book.id, 'quantity': 5})
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 5)
+
+    def test_add_is_a_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            CartItem.objects.add_quantity(self.cart.id, self.book.id, 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_mysql_upsert_qualifies_columns(self):
+        # INSERT ... SELECT reads the cart and book tables, which also have an id column
+        cursor = mock.MagicMock(rowcount=0)
+        with mock.patch.object(connection, 'vendor', 'mysql'), \
+                mock.patch.object(connection, 'cursor') as cursor_factory:
+            cursor_factory.return_value.__enter__.return_value = cursor
+            self.assertIsNone(CartItem.objects.add_quantity(self.cart.id, self.book.id, 1))
+        update = cursor.execute.call_args[0][0].split('ON DUPLICATE KEY UPDATE')[1]
+        table = CartItem._meta.db_table
+        self.assertEqual(
+            update.strip(),
+            f'{table}.id = LAST_INSERT_ID({table}.id), {table}.quantity = {table}.quantity + %s'
+        )
+
+    def test_unknown_book_is_400(self):
+        response = self.client.post(self.url, {'book_id': 9999, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('book_id', response.json())
+
+    def test_unknown_cart_is_404(self):
+        response = self.client.post(f'/store/carts/{uuid4()}/items/', {'book_id': self.book.id, 'quantity': 1})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConcurrentAddCartItemTests(TransactionTestCase):
+    def test_parallel_adds_of_same_book(self):
+        book = Book.objects.create(
+            title='Book', description='Desc', stock=10, price='5.00',
+            author=Author.objects.create(title='Author', bio='Bio'),
+            genre=Genre.objects.create(title='Fiction')
+        )
+        cart = Cart.objects.create()
+        threads, per_thread = 8, 5
+        errors = []
+
+        def add_one():
+            # SQLite's shared-cache test database raises instead of waiting on table locks
+            while True:
+                try:
+                    return CartItem.objects.add_quantity(cart.id, book.id, 1)
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+
+        def worker():
+            try:
+                for _ in range(per_thread):
+                    add_one()
+            except Exception as exc:  # surfaced in the assertion below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        pool = [Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartItem.objects.get(cart=cart, book=book).quantity, threads * per_thread)
+
+
+class BatchCartItemTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='secret')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.books = [
+            Book.objects.create(title=f'Book {i}', description='Desc', stock=10, price='2.50', author=author, genre=genre)
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.url = f'/store/carts/{self.cart.id}/items/batch/'
+
+    def test_add_update_remove_in_one_request(self):
+        a, b, c, d = self.books
+        CartItem.objects.create(cart=self.cart, book=a, quantity=1)
+        CartItem.objects.create(cart=self.cart, book=b, quantity=1)
+        CartItem.objects.create(cart=self.cart, book=c, quantity=1)
+        payload = {
+            'add': [{'book_id': a.id, 'quantity': 2}, {'book_id': d.id, 'quantity': 1}],
+            'update': [{'book_id': b.id, 'quantity': 7}],
+            'remove': [c.id],
+        }
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['book']['id']: item['quantity'] for item in response.json()['items']}
+        self.assertEqual(quantities, {a.id: 3, b.id: 7, d.id: 1})
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        payload = {'add': [{'book_id': book.id, 'quantity': 1} for book in self.books]}
+        # cart lookup, book IN check, cart lock, item lock, remove, bulk insert, cart reload + prefetch
+        response, _ = self.assertMaxQueries(11, self.client.post, self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_book_rejects_whole_batch(self):
+        payload = {'add': [{'book_id': self.books[0].id, 'quantity': 1}, {'book_id': 9999, 'quantity': 1}]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_quantity_above_column_maximum_is_rejected(self):
+        book = self.books[0]
+        CartItem.objects.create(cart=self.cart, book=book, quantity=32767)
+        response = self.client.post(self.url, {'add': [{'book_id': book.id, 'quantity': 32767}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(CartItem.objects.get(cart=self.cart, book=book).quantity, 32767)
+
+    def test_insert_tolerates_row_added_concurrently(self):
+        book = self.books[0]
+        serializer = BatchCartItemSerializer(
+            data={'add': [{'book_id': book.id, 'quantity': 2}]}, context={'cart_id': self.cart.id}
+        )
+        serializer.is_valid(raise_exception=True)
+        original = CartItem.objects.bulk_update
+        def race_then_update(*args, **kwargs):
+            # Another request inserts the book after this batch found it missing
+            CartItem.objects.create(cart=self.cart, book=book, quantity=1)
+            return original(*args, **kwargs)
+        with mock.patch.object(CartItem.objects, 'bulk_update', side_effect=race_then_update):
+            serializer.save()
+        self.assertEqual(CartItem.objects.get(cart=self.cart, book=book).quantity, 2)
+
+
+class AbandonedCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.books = [
+            Book.objects.create(title=f'Book {i}', description='D', stock=10, price='2.50', author=author, genre=genre)
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='shopper', password='secret'))
+
+    def idle_cart(self, days, items=1):
+        cart = Cart.objects.create()
+        for book in self.books[:items]:
+            CartItem.objects.create(cart=cart, book=book, quantity=1)
+        Cart.objects.filter(pk=cart.pk).update(last_activity=timezone.now() - timedelta(days=days))
+        return cart
+
+    def reap(self, **options):
+        out = StringIO()
+        call_command('reap_abandoned_carts', stdout=out, **options)
+        return out.getvalue()
+
+    def test_item_writes_bump_last_activity(self):
+        cart = self.idle_cart(40, items=0)
+        url = f'/store/carts/{cart.id}/items/'
+        writes = [
+            lambda: self.client.post(url, {'book_id': self.books[0].id, 'quantity': 1}),
+            lambda: self.client.patch(f'{url}{CartItem.objects.get(cart=cart).id}/', {'quantity': 2}),
+            lambda: self.client.delete(f'{url}{CartItem.objects.get(cart=cart).id}/'),
+            lambda: self.client.post(f'{url}batch/', {'add': [{'book_id': self.books[1].id, 'quantity': 1}]}, format='json'),
+        ]
+        for write in writes:
+            Cart.objects.filter(pk=cart.pk).update(last_activity=timezone.now() - timedelta(days=40))
+            self.assertLess(write().status_code, 300)
+            cart.refresh_from_db()
+            self.assertGreater(cart.last_activity, timezone.now() - timedelta(minutes=1))
+
+    def test_reaps_only_idle_carts_in_batches(self):
+        idle = [self.idle_cart(40, items=i % 3) for i in range(7)]
+        fresh = self.idle_cart(2, items=2)
+        self.assertIn('Would delete 7 cart(s) and 6 cart item(s).', self.reap(dry_run=True))
+        self.assertEqual(Cart.objects.count(), 8)
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self.reap(batch_size=3)
+        self.assertIn('Reclaimed 13 row(s): 7 cart(s) and 6 cart item(s) idle for over 30 day(s), in 3 batch(es).', output)
+        self.assertEqual(list(Cart.objects.all()), [fresh])
+        self.assertFalse(CartItem.objects.filter(cart_id__in=[cart.id for cart in idle]).exists())
+        self.assertEqual(CartItem.objects.filter(cart=fresh).count(), 2)
+        # One DELETE for the items and one for the carts per batch of at most 3 carts
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 6)
+
+    def test_ttl_option(self):
+        self.idle_cart(3)
+        self.assertIn('0 cart(s)', self.reap())
+        self.assertIn('1 cart(s)', self.reap(ttl_days=1))
+        self.assertFalse(Cart.objects.exists())
+
+
+class CartTotalsTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='secret')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.cheap = Book.objects.create(title='Cheap', description='D', stock=9, price='0.10', author=author, genre=genre)
+        cls.dear = Book.objects.create(title='Dear', description='D', stock=9, price='19.99', author=author, genre=genre)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        CartItem.objects.create(cart=self.cart, book=self.cheap, quantity=3)
+        CartItem.objects.create(cart=self.cart, book=self.dear, quantity=2)
+
+    def test_retrieve_totals_are_exact(self):
+        response, _ = self.assertMaxQueries(2, self.client.get, f'/store/carts/{self.cart.id}/')
+        data = response.json()
+        self.assertEqual(data['total_price'], '40.28')
+        self.assertEqual(sorted(item['total_price'] for item in data['items']), ['0.30', '39.98'])
+
+    def test_summary_is_a_single_query(self):
+        response, _ = self.assertMaxQueries(1, self.client.get, f'/store/carts/{self.cart.id}/summary/')
+        self.assertEqual(response.json(), {
+            'id': str(self.cart.id), 'item_count': 2, 'total_quantity': 5, 'total_price': '40.28'
+        })
+
+    def test_empty_cart_totals(self):
+        response = self.client.post('/store/carts/')
+        self.assertEqual(response.json()['total_price'], '0.00')
+        summary = self.client.get(f"/store/carts/{response.json()['id']}/summary/").json()
+        self.assertEqual((summary['item_count'], summary['total_price']), (0, '0.00'))
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret')
+        cls.customer = Customer.objects.create(user=cls.user, phone='555')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.first = Book.objects.create(title='First', description='D', stock=5, price='3.50', author=author, genre=genre)
+        cls.second = Book.objects.create(title='Second', description='D', stock=1, price='10.00', author=author, genre=genre)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.url = f'/store/carts/{self.cart.id}/checkout/'
+
+    def test_checkout_creates_order_and_reserves_stock(self):
+        CartItem.objects.create(cart=self.cart, book=self.first, quantity=2)
+        CartItem.objects.create(cart=self.cart, book=self.second, quantity=1)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.customer, self.customer)
+        self.assertEqual(order.total_amount, Decimal('17.00'))
+        self.assertEqual(
+            sorted(order.items.values_list('book_id', 'quantity', 'unit_price')),
+            [(self.first.id, 2, Decimal('3.50')), (self.second.id, 1, Decimal('10.00'))]
+        )
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (3, 0))
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_insufficient_stock_changes_nothing(self):
+        CartItem.objects.create(cart=self.cart, book=self.first, quantity=1)
+        CartItem.objects.create(cart=self.cart, book=self.second, quantity=2)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_empty_cart_is_rejected(self):
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+
+
+class BookCountTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.author = Author.objects.create(title='Author', bio='Bio')
+        self.other_author = Author.objects.create(title='Other', bio='Bio')
+        self.fiction = Genre.objects.create(title='Fiction')
+        self.poetry = Genre.objects.create(title='Poetry')
+
+    def counts(self):
+        return (
+            list(Author.objects.order_by('pk').values_list('book_count', flat=True)),
+            list(Genre.objects.order_by('pk').values_list('book_count', flat=True)),
+        )
+
+    def test_counters_follow_create_move_and_delete(self):
+        book = Book.objects.create(title='B', description='D', stock=1, price='1.00', author=self.author, genre=self.fiction)
+        Book.objects.create(title='C', description='D', stock=1, price='1.00', author=self.author, genre=self.fiction)
+        self.assertEqual(self.counts(), ([2, 0], [2, 0]))
+
+        book = Book.objects.get(pk=book.pk)
+        book.genre = self.poetry
+        book.author = self.other_author
+        book.save()
+        self.assertEqual(self.counts(), ([1, 1], [1, 1]))
+
+        book.delete()
+        self.assertEqual(self.counts(), ([1, 0], [1, 0]))
+
+    def test_listings_read_counters_in_one_query(self):
+        for i in range(5):
+            Book.objects.create(title=f'B{i}', description='D', stock=1, price='1.00', author=self.author, genre=self.fiction)
+        response, _ = self.assertMaxQueries(1, self.client.get, '/store/genres/')
+        counts = {row['title']: row['product_count'] for row in response.json()['results']}
+        self.assertEqual(counts, {'Fiction': 5, 'Poetry': 0})
+        response, _ = self.assertMaxQueries(1, self.client.get, '/store/authors/')
+        counts = {row['title']: row['total_books'] for row in response.json()['results']}
+        self.assertEqual(counts, {'Author': 5, 'Other': 0})
+
+    def test_rebuild_matches_grouped_count(self):
+        Book.objects.create(title='B', description='D', stock=1, price='1.00', author=self.author, genre=self.poetry)
+        Author.objects.update(book_count=42)
+        Genre.objects.update(book_count=42)
+        Author.objects.refresh_book_counts()
+        Genre.objects.refresh_book_counts()
+        self.assertEqual(self.counts(), ([1, 0], [0, 1]))
+
+
+def make_image(width, height, fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'navy').save(buffer, fmt)
+    return SimpleUploadedFile(f'upload.{fmt.lower()}', buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.author = Author.objects.create(title='Author', bio='Bio')
+        cls.genre = Genre.objects.create(title='Fiction')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_variants_are_generated_and_exposed(self):
+        book = Book.objects.create(
+            title='Book', description='Desc', stock=1, price='5.00', author=self.author,
+            genre=self.genre, cover_image=make_image(900, 1350)
+        )
+        self.assertEqual(generate_variants(book.cover_image.storage, book.cover_image.name), 6)
+        self.assertEqual(generate_variants(book.cover_image.storage, book.cover_image.name), 0)
+
+        card = variant_name(book.cover_image.name, 'card', 'webp')
+        with book.cover_image.storage.open(card) as stored:
+            self.assertEqual(Image.open(stored).size, (320, 480))
+
+        variants = self.client.get(f'/store/books/{book.id}/').json()['cover_variants']
+        self.assertEqual(set(variants), {'thumbnail', 'card', 'full'})
+        self.assertTrue(variants['card']['webp'].endswith(card))
+
+    def test_pending_variants_point_at_the_original(self):
+        book = Book.objects.create(
+            title='Book', description='Desc', stock=1, price='5.00', author=self.author,
+            genre=self.genre, cover_image=make_image(900, 1350)
+        )
+        body = self.client.get(f'/store/books/{book.id}/').json()
+        self.assertEqual(body['cover_variants']['card']['webp'], body['cover_image'])
+
+    def test_any_reasonable_size_is_accepted(self):
+        validate_cover_image_size(make_image(1024, 1536))
+        validate_author_image_size(make_image(300, 300))
+        with self.assertRaises(DjangoValidationError):
+            validate_cover_image_size(make_image(50, 80))
+
+
+class ImageValidationTests(TestCase):
+    def test_oversized_bytes_rejected_before_reading_header(self):
+        upload = SimpleUploadedFile('big.png', b'\0' * (2048 * 1024 + 1))
+        with mock.patch('store.validation.Image.open') as image_open:
+            with self.assertRaisesMessage(DjangoValidationError, 'file size'):
+                validate_cover_image(upload)
+        image_open.assert_not_called()
+
+    def test_decompression_bomb_rejected_from_header(self):
+        buffer = BytesIO()
+        Image.new('1', (7000, 7000)).save(buffer, 'PNG')
+        upload = SimpleUploadedFile('bomb.png', buffer.getvalue())
+        with self.assertRaisesMessage(DjangoValidationError, 'pixels'):
+            validate_cover_image(upload)
+
+    def test_header_is_read_once_per_upload(self):
+        upload = make_image(400, 600)
+        with mock.patch('store.validation.Image.open', wraps=Image.open) as image_open:
+            validate_cover_image(upload)
+            validate_cover_image(upload)
+        self.assertEqual(image_open.call_count, 1)
+        self.assertEqual(upload.tell(), 0)
+
+    def test_non_image_rejected(self):
+        with self.assertRaises(DjangoValidationError):
+            validate_cover_image(SimpleUploadedFile('notes.png', b'not an image'))
+
+    def test_image_with_disallowed_extension_rejected(self):
+        upload = make_image(400, 600)
+        upload.name = 'cover.html'
+        with self.assertRaisesMessage(DjangoValidationError, 'extension'):
+            validate_cover_image(upload)
+
+
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.author = Author.objects.create(title='Author', bio='Bio')
+        cls.genre = Genre.objects.create(title='Fiction')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media_root = Path(media.name)
+
+    def create_book(self, upload):
+        return Book.objects.create(
+            title='Book', description='Desc', stock=1, price='5.00', author=self.author,
+            genre=self.genre, cover_image=upload
+        )
+
+    def test_identical_uploads_share_one_sharded_blob(self):
+        data = make_image(300, 450).read()
+        first = self.create_book(SimpleUploadedFile('a.png', data))
+        second = self.create_book(SimpleUploadedFile('b.PNG', data))
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(first.cover_image.name, f'book_covers/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual(second.cover_image.name, first.cover_image.name)
+        self.assertEqual(len(list((self.media_root / 'book_covers').rglob('*.png'))), 1)
+
+    def test_extension_comes_from_the_detected_format(self):
+        data = make_image(300, 450, 'JPEG').read()
+        book = self.create_book(SimpleUploadedFile('cover.png', data))
+        self.assertTrue(book.cover_image.name.endswith('.jpg'))
+
+    def test_garbage_collection_keeps_referenced_blobs(self):
+        kept = self.create_book(make_image(300, 450))
+        generate_variants(kept.cover_image.storage, kept.cover_image.name)
+        orphan = self.create_book(make_image(320, 480))
+        orphan_path = Path(orphan.cover_image.path)
+        orphan.delete()
+
+        call_command('collect_media_garbage', grace_minutes=0, stdout=StringIO())
+
+        self.assertFalse(orphan_path.exists())
+        self.assertTrue(Path(kept.cover_image.path).exists())
+        self.assertTrue(kept.cover_image.storage.exists(variant_name(kept.cover_image.name, 'card', 'webp')))
+
+    def test_reuploading_an_orphaned_blob_restarts_its_grace_period(self):
+        data = make_image(300, 450).read()
+        orphan = self.create_book(SimpleUploadedFile('a.png', data))
+        path = Path(orphan.cover_image.path)
+        orphan.delete()
+        stale = path.stat().st_mtime - 2 * 60 * 60
+        os.utime(path, (stale, stale))
+
+        # Same bytes saved again for a row that has not been committed yet
+        name = media_storage().save('book_covers/b.png', SimpleUploadedFile('b.png', data))
+        self.assertEqual(name, orphan.cover_image.name)
+        call_command('collect_media_garbage', grace_minutes=60, stdout=StringIO())
+        self.assertTrue(path.exists())
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        (Path(media.name) / 'book_covers').mkdir()
+        self.data = bytes(range(256)) * 4
+        (Path(media.name) / 'book_covers' / 'cover.png').write_bytes(self.data)
+        self.url = '/media/book_covers/cover.png'
+
+    def test_full_file_with_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300, must-revalidate')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertFalse(response.get('Content-Disposition', '').startswith('attachment'))
+        self.assertTrue(response['ETag'] and response['Last-Modified'])
+
+    def test_non_images_are_downloaded_not_rendered(self):
+        for name in ['page.html', 'drawing.svg']:
+            (Path(settings.MEDIA_ROOT) / 'book_covers' / name).write_bytes(b'<script>alert(1)</script>')
+            response = self.client.get(f'/media/book_covers/{name}')
+            self.assertEqual(response['Content-Type'], 'application/octet-stream', name)
+            self.assertEqual(response['Content-Disposition'], 'attachment', name)
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff', name)
+
+    def test_only_content_addressed_names_are_immutable(self):
+        digest = hashlib.sha256(self.data).hexdigest()
+        for name, immutable in [
+            (f'book_covers/{digest[:2]}/{digest[2:4]}/{digest}.png', True),
+            (f'book_covers/{digest[:2]}/{digest[2:4]}/variants/{digest}/card.webp', False),
+            ('review_img/1.png', False),
+        ]:
+            path = Path(settings.MEDIA_ROOT) / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(self.data)
+            cache_control = self.client.get(f'/media/{name}')['Cache-Control']
+            self.assertEqual('immutable' in cache_control, immutable, name)
+            self.assertEqual('must-revalidate' in cache_control, not immutable, name)
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    def test_multiple_ranges_get_the_full_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1,4-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+    def test_accel_redirect_handoff(self):
+        with self.settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/book_covers/cover.png')
+        self.assertEqual(response.content, b'')
+
+    def test_path_traversal_and_missing_files_are_404(self):
+        self.assertEqual(self.client.get('/media/../core/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/book_covers/missing.png').status_code, 404)
+
+
+class AsyncReadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        cls.author = Author.objects.create(title='Author', bio='Bio')
+        cls.genre = Genre.objects.create(title='Fiction')
+        cls.books = [
+            Book.objects.create(title=f'Book {i}', description='D', stock=1, price='4.00', author=cls.author, genre=cls.genre)
+            for i in range(5)
+        ]
+        cls.cart = Cart.objects.create()
+        CartItem.objects.create(cart=cls.cart, book=cls.books[0], quantity=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def auth(self, user):
+        return {'headers': {'Authorization': f'Bearer {AccessToken.for_user(user)}'}}
+
+    async def test_book_detail_matches_sync_endpoint(self):
+        book = self.books[0]
+        sync = await sync_to_async(self.client.get)(f'/store/books/{book.id}/', **self.auth(self.user))
+        response = await self.async_client.get(f'/store/async/books/{book.id}/', **self.auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync.json())
+
+    async def test_book_list_keyset_pages(self):
+        seen = []
+        url = '/store/async/books/?page_size=2'
+        while url:
+            data = (await self.async_client.get(url, **self.auth(self.user))).json()
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [book.id for book in reversed(self.books)])
+
+    async def test_cursors_are_shared_with_the_sync_endpoint(self):
+        sync = await sync_to_async(self.client.get)('/store/books/?page_size=2', **self.auth(self.user))
+        cursor = sync.json()['next'].split('cursor=')[1].split('&')[0]
+        page = (await self.async_client.get(f'/store/async/books/?page_size=2&cursor={cursor}', **self.auth(self.user))).json()
+        self.assertEqual([row['id'] for row in page['results']], [self.books[2].id, self.books[1].id])
+        self.assertIsNotNone(page['previous'])
+        invalid = await self.async_client.get('/store/async/books/?cursor=bogus', **self.auth(self.user))
+        self.assertEqual(invalid.status_code, 404)
+
+    async def test_cart_and_staff_endpoints(self):
+        cart = (await self.async_client.get(f'/store/async/carts/{self.cart.id}/', **self.auth(self.user))).json()
+        self.assertEqual(cart['total_price'], '8.00')
+        forbidden = await self.async_client.get('/store/async/genres/', **self.auth(self.user))
+        self.assertEqual(forbidden.status_code, 403)
+        genres = (await self.async_client.get('/store/async/genres/', **self.auth(self.admin))).json()
+        self.assertEqual(genres['results'][0]['product_count'], 5)
+        author = await self.async_client.get(f'/store/async/authors/{self.author.id}/', **self.auth(self.admin))
+        self.assertEqual(author.json()['total_books'], 5)
+
+    async def test_requires_token(self):
+        response = await self.async_client.get('/store/async/books/')
+        self.assertEqual(response.status_code, 401)
+
+
+class OpenAPISchemaTests(TestCase):
+    def setUp(self):
+        schema._documents.clear()
+        self.addCleanup(schema._documents.clear)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / 'openapi.json'
+        override = override_settings(OPENAPI_SCHEMA_PATH=str(self.path), CODE_VERSION='test')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_generated_once_per_process_with_etag(self):
+        with mock.patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            first = self.client.get('/swagger.json', HTTP_ACCEPT='application/json')
+            second = self.client.get('/swagger.json', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('/store/books/', first.json()['paths'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(self.client.get('/swagger/?format=openapi').content, first.content)
+        self.assertTrue(self.client.get('/swagger.json').content.startswith(b"swagger: '2.0'"))
+
+    def test_serves_build_artifact(self):
+        call_command('build_openapi_schema', stdout=StringIO())
+        with mock.patch.object(schema, 'generate_schema') as generate:
+            response = self.client.get('/swagger.json', HTTP_ACCEPT='application/json')
+        generate.assert_not_called()
+        self.assertEqual(response.content, self.path.read_bytes())
+        self.assertEqual(response['ETag'], f'"{hashlib.sha1(response.content).hexdigest()}"')
+
+    def test_ignores_artifact_from_another_release(self):
+        self.path.write_text('{"x-code-version": "old", "paths": {}}')
+        response = self.client.get('/swagger.json', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['x-code-version'], 'test')
+        self.assertIn('/store/books/', response.json()['paths'])
+
+    def test_corrupt_artifact_is_regenerated(self):
+        for content in (b'{"x-code-version": "te', b'[]', b'\xff\xfe'):
+            schema._documents.clear()
+            self.path.write_bytes(content)
+            response = self.client.get('/swagger.json', HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 200, content)
+            self.assertIn('/store/books/', response.json()['paths'])
+
+    def test_unset_version_is_derived_from_the_code(self):
+        with override_settings(CODE_VERSION=None):
+            version = schema.code_version()
+        self.assertTrue(version)
+        self.assertNotEqual(version, 'dev')
+
+
+class CatalogImportExportTests(TestCase):
+    CSV = (
+        'isbn,title,description,stock,price,author,genre\n'
+        '9780000000001,Dune,Spice,4,9.99,Frank Herbert,Science Fiction\n'
+        '9780000000002,Emma,Matchmaking,2,5.50,Jane Austen,Classics\n'
+        '9780000000003,Bad,Row,many,1.00,Nobody,Classics\n'
+        '9780000000004,Persuasion,Navy,1,6.00,Jane Austen,Classics\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        cls.austen = Author.objects.create(title='Jane Austen', bio='Bio')
+
+    def import_csv(self, content, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(content)
+        self.addCleanup(Path(f.name).unlink)
+        out = StringIO()
+        call_command('import_catalog', f.name, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_import_resolves_relations_and_maintains_denormalized_data(self):
+        output = self.import_csv(self.CSV, batch_size=2)
+        self.assertIn('3 created, 0 updated, 1 new author(s), 2 new genre(s), 1 rejected', output)
+        self.assertEqual(Author.objects.filter(title='Jane Austen').count(), 1)
+        self.austen.refresh_from_db()
+        self.assertEqual(self.austen.book_count, 2)
+        classics = Genre.objects.get(slug='classics')
+        self.assertEqual(classics.book_count, 2)
+        self.assertEqual([book.title for book in search_books('dune')], ['Dune'])
+
+    def test_reimport_upserts_by_isbn(self):
+        self.import_csv(self.CSV)
+        output = self.import_csv(
+            'isbn,title,description,stock,price,author,genre\n'
+            '9780000000002,Emma,Revised,7,6.50,Jane Austen,Romance\n'
+        )
+        self.assertIn('0 created, 1 updated', output)
+        emma = Book.objects.get(isbn='9780000000002')
+        self.assertEqual((emma.description, emma.stock, emma.price, emma.genre.title), ('Revised', 7, Decimal('6.50'), 'Romance'))
+        self.assertEqual(Genre.objects.get(slug='classics').book_count, 1)
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_export_streams_what_import_reads(self):
+        self.import_csv(self.CSV)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/store/books/export/?type=jsonl')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+        Book.objects.all().delete()
+        upload = SimpleUploadedFile('catalog.jsonl', '\n'.join(lines).encode())
+        result = client.post('/store/books/import/', {'file': upload}).json()
+        self.assertEqual((result['created'], result['error_count']), (3, 0))
+        self.assertEqual(Book.objects.get(isbn='9780000000001').price, Decimal('9.99'))
+
+    def test_export_reads_keyset_slices(self):
+        self.import_csv(self.CSV)
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(export_catalog('jsonl', chunk_size=2))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 1])
+        isbns = [json.loads(line)['isbn'] for line in ''.join(chunks).splitlines()]
+        self.assertEqual(isbns, list(Book.objects.order_by('pk').values_list('isbn', flat=True)))
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn('> ', ctx.captured_queries[1]['sql'])
+
+    def test_endpoints_are_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='reader', password='secret'))
+        self.assertEqual(client.get('/store/books/export/').status_code, 403)
+
+    def test_stock_above_the_column_maximum_is_rejected(self):
+        output = self.import_csv(
+            'isbn,title,description,stock,price,author,genre\n'
+            f'9780000000009,Huge,Stock,{10 ** 20},1.00,Jane Austen,Classics\n'
+        )
+        self.assertIn('0 created, 0 updated', output)
+        self.assertFalse(Book.objects.exists())
+
+    def test_unreadable_files_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        header = b'isbn,title,description,stock,price,author,genre\n'
+        for content, message in [
+            (header + b'978,Caf\xe9,D,1,1.00,A,G\n', 'not valid UTF-8'),
+            (header + b'978,"' + b'x' * 200_000 + b'",D,1,1.00,A,G\n', 'Malformed CSV after line 1'),
+        ]:
+            response = client.post('/store/books/import/', {'file': SimpleUploadedFile('catalog.csv', content)})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.json()['error'])
+        with self.assertRaisesMessage(CommandError, 'not valid UTF-8'):
+            with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as f:
+                f.write(header + b'978,Caf\xe9,D,1,1.00,A,G\n')
+            self.addCleanup(Path(f.name).unlink)
+            call_command('import_catalog', f.name, stdout=StringIO())
+
+
+class StreamingListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.books = [
+            Book.objects.create(title=f'Book {i}', description='D', stock=1, price='4.00', author=author, genre=genre)
+            for i in range(7)
+        ]
+        for i, user in enumerate(User.objects.create_user(username=f'u{i}', password='x') for i in range(3)):
+            Review.objects.create(book=cls.books[0], user=user, score=i + 1, description='R')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stream(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            body = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return body, len(ctx.captured_queries)
+
+    def test_json_array_matches_detail_rows_in_constant_queries(self):
+        with mock.patch('store.views.BookViewSet.stream_chunk_size', 2):
+            body, queries = self.stream('/store/books/?stream=json')
+        rows = json.loads(body)
+        # Same order as the paginated list: newest first
+        self.assertEqual([row['id'] for row in rows], [book.id for book in reversed(self.books)])
+        self.assertEqual(rows[3], self.client.get(f'/store/books/{self.books[3].id}/').json())
+        # One LIMIT 2 query per chunk (author/genre joined), continuing from the previous chunk's last row
+        self.assertEqual(queries, 4)
+
+    def test_ties_in_the_ordering_are_streamed_once(self):
+        # Every book has the same price, so only the id tie-breaker tells chunks apart
+        with mock.patch('store.views.BookViewSet.stream_chunk_size', 3):
+            body, _ = self.stream('/store/books/?stream=ndjson&ordering=-price')
+        ids = [json.loads(line)['id'] for line in body.decode().splitlines()]
+        self.assertEqual(ids, [book.id for book in reversed(self.books)])
+
+    def test_ndjson_reviews(self):
+        body, _ = self.stream(f'/store/books/{self.books[0].id}/review/?stream=ndjson')
+        scores = [json.loads(line)['score'] for line in body.decode().splitlines()]
+        self.assertEqual(scores, [1, 2, 3])
+
+    def test_empty_and_invalid(self):
+        Book.objects.all().delete()
+        self.assertEqual(self.stream('/store/books/?stream=json')[0], b'[]')
+        self.assertEqual(self.client.get('/store/books/?stream=xml').status_code, 400)
+
+
+class BookFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        call_command(
+            'generate_catalog', authors=30, genres=8, books=600, users=0, reviews=0, carts=0, seed=7,
+            stdout=StringIO()
+        )
+        ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+        Book.objects.filter(pk__in=ids[::4]).update(average_rating=Decimal('4.5'))
+        Book.objects.filter(pk__in=ids[::5]).update(stock=0)
+        cls.genre = Genre.objects.order_by('pk').first()
+        cls.author = Author.objects.order_by('pk').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fetch_all(self, query):
+        ids, url = [], f'/store/books/?page_size=100&{query}'
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return ids
+
+    def test_filters_match_orm(self):
+        expected = Book.objects.filter(
+            genre=self.genre, price__gte=20, price__lte=60, stock__gt=0
+        ).order_by('price', 'id').values_list('id', flat=True)
+        self.assertEqual(
+            self.fetch_all(f'genre={self.genre.id}&price_min=20&price_max=60&in_stock=true&ordering=price'),
+            list(expected)
+        )
+        self.assertEqual(
+            sorted(self.fetch_all(f'author={self.author.id}&min_rating=4')),
+            sorted(Book.objects.filter(author=self.author, average_rating__gte=4).values_list('id', flat=True))
+        )
+
+    def test_pages_through_tie_groups_larger_than_the_offset_cutoff(self):
+        Book.objects.bulk_create([
+            Book(title=f'Tie {i}', description='D', stock=1, price='12.34', author=self.author, genre=self.genre)
+            for i in range(1150)
+        ])
+        for ordering in ('price', '-price'):
+            with self.subTest(ordering=ordering):
+                query = f'price_min=12.34&price_max=12.34&ordering={ordering}'
+                expected = Book.objects.filter(price=Decimal('12.34')).order_by(ordering, ordering.replace('price', 'id'))
+                self.assertEqual(self.fetch_all(query), list(expected.values_list('id', flat=True)))
+
+        # Later pages are a keyset range, not an OFFSET into the tie group
+        first = self.client.get('/store/books/?ordering=price&page_size=100').json()
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(first['next']).json()
+        self.assertNotIn('OFFSET', ' '.join(q['sql'] for q in ctx.captured_queries))
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in first['results']])
+
+    def test_keyset_plan_avoids_full_scans(self):
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+        for query in ('ordering=price', 'ordering=-average_rating', ''):
+            with self.subTest(query=query):
+                first = self.client.get(f'/store/books/?page_size=100&{query}').json()
+                self.assertNoFullScan(self.book_list_sql(first['next'].split('?', 1)[1]))
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/store/books/?cursor=bm9wZQ==').status_code, 404)
+        self.assertEqual(self.client.get('/store/books/?ordering=price&cursor=eyJwIjpbMV19').status_code, 404)
+
+    def test_rejects_unindexed_ordering_and_bad_values(self):
+        for query in ('ordering=title', 'ordering=price,created_at', 'price_min=abc', 'min_rating=9'):
+            self.assertEqual(self.client.get(f'/store/books/?{query}').status_code, 400, query)
+
+    def test_query_plans_avoid_full_scans(self):
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+        queries = [
+            '', 'ordering=price', 'ordering=-average_rating', f'genre={self.genre.id}',
+            f'genre={self.genre.id}&price_min=10&price_max=30&ordering=price', f'author={self.author.id}',
+            'price_min=90', 'min_rating=4.5', 'in_stock=true', f'genre={self.genre.id}&in_stock=false',
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertNoFullScan(self.book_list_sql(query))
+
+    def book_list_sql(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(f'/store/books/?{query}').status_code, 200)
+        return next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "store_book"' in q['sql'])
+
+    def assertNoFullScan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f'EXPLAIN {sql}')
+                columns = [col[0] for col in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                full_scans = [row for row in plan if row['table'] == 'store_book' and row['type'] == 'ALL']
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1].strip() for row in cursor.fetchall()]
+                # Walking a whole index is only cheap when it also yields the ORDER BY (and LIMIT stops it)
+                sorted_after = 'USE TEMP B-TREE FOR ORDER BY' in plan
+                full_scans = [
+                    line for line in plan
+                    if line == 'SCAN store_book' or (line.startswith('SCAN store_book ') and sorted_after)
+                ]
+        self.assertFalse(full_scans, f'{sql}\n{plan}')
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        cls.author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.book = Book.objects.create(title='Book', description='D', stock=1, price='4.00', author=cls.author, genre=genre)
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def scrape(self):
+        response = self.client.get('/store/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_records_per_route_metrics(self):
+        for _ in range(2):
+            self.client.get('/store/books/')
+        self.client.get(f'/store/books/{self.book.id}/')
+        text = self.scrape()
+        self.assertIn('store_http_requests_total{route="book-list",method="GET",status="2xx"} 2', text)
+        self.assertIn('store_http_request_duration_seconds_count{route="book-detail"} 1', text)
+        queries = next(line for line in text.splitlines() if line.startswith('store_db_queries_total{route="book-list"}'))
+        self.assertGreater(int(queries.split()[-1]), 0)
+        serializer = next(line for line in text.splitlines() if line.startswith('store_serializer_seconds_total{route="book-list"}'))
+        self.assertGreater(float(serializer.split()[-1]), 0)
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        def view_with_n_plus_one():
+            request_metrics = metrics.RequestMetrics()
+            token = metrics._current.set(request_metrics)
+            try:
+                for pk in (1, 2, 3):
+                    list(Author.objects.filter(pk=pk))
+            finally:
+                metrics._current.reset(token)
+            return request_metrics
+
+        request_metrics = view_with_n_plus_one()
+        self.assertEqual(request_metrics.queries, 3)
+        [(fingerprint, extra)] = request_metrics.duplicates().items()
+        self.assertIn('FROM "store_author"', fingerprint)
+        self.assertEqual(extra, 2)
+
+    def test_slow_requests_are_logged_with_a_profile(self):
+        with override_settings(METRICS_SLOW_REQUEST_SECONDS=0, METRICS_PROFILE_SAMPLE_RATE=1, METRICS_PROFILE_INTERVAL=0.0005):
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            with self.assertLogs('store.metrics', level='WARNING') as logs:
+                client.get('/store/books/')
+        self.assertIn('Slow request GET /store/books/ (book-list)', logs.output[0])
+
+    async def test_async_requests_are_recorded(self):
+        token = {'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+        response = await self.async_client.get('/store/async/books/', headers=token)
+        self.assertEqual(response.status_code, 200)
+        text = await sync_to_async(self.scrape)()
+        self.assertIn('store_http_requests_total{route="async-book-list",method="GET",status="2xx"} 1', text)
+        queries = next(line for line in text.splitlines() if line.startswith('store_db_queries_total{route="async-book-list"}'))
+        self.assertGreater(int(queries.split()[-1]), 0)
+
+    def test_scrape_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='reader', password='secret'))
+        self.assertEqual(client.get('/store/metrics/').status_code, 403)
+
+
+class AuthorWithCountSerializer(serializers.ModelSerializer):
+    # Deliberately per-object, as AuthorSerializer.total_books used to be
+    total_books = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Author
+        fields = ['id', 'title', 'total_books']
+
+    def get_total_books(self, author):
+        return author.books.count()
+
+
+def n_plus_one_view(request):
+    return JsonResponse(AuthorWithCountSerializer(Author.objects.all(), many=True).data, safe=False)
+
+
+async def async_n_plus_one_view(request):
+    return await sync_to_async(n_plus_one_view)(request)
+
+
+urlpatterns = [path('n-plus-one/', n_plus_one_view), path('async/n-plus-one/', async_n_plus_one_view)]
+
+
+class NPlusOneDetectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(title='Fiction')
+        for i in range(6):
+            author = Author.objects.create(title=f'Author {i}', bio='Bio')
+            Book.objects.create(title=f'Book {i}', description='D', stock=1, price='4.00', author=author, genre=genre)
+
+    def test_attributes_pattern_to_serializer_field_and_method(self):
+        with detect_n_plus_one(threshold=5) as detector:
+            AuthorWithCountSerializer(Author.objects.all(), many=True).data
+        [(fingerprint, pattern)] = detector.problems().items()
+        self.assertIn('FROM "store_book"', fingerprint)
+        self.assertEqual(pattern.count, 6)
+        [((field, caller), count)] = pattern.origins.items()
+        self.assertEqual(field, 'AuthorWithCountSerializer.total_books')
+        self.assertTrue(caller.startswith('AuthorWithCountSerializer.get_total_books (store/tests.py:'), caller)
+        self.assertEqual(count, 6)
+
+    def test_batched_lookups_pass(self):
+        with detect_n_plus_one(threshold=5) as detector:
+            list(Author.objects.prefetch_related('books'))
+            AuthorSerializer(Author.objects.all(), many=True).data
+        self.assertFalse(detector.problems())
+
+    @override_settings(ROOT_URLCONF='store.tests')
+    def test_middleware_fails_requests_in_tests_and_logs_otherwise(self):
+        with self.assertRaisesMessage(NPlusOneError, 'via AuthorWithCountSerializer.get_total_books'):
+            self.client.get('/n-plus-one/')
+        with override_settings(NPLUSONE_MODE='log'), self.assertLogs('store.nplusone', level='WARNING'):
+            self.assertEqual(Client().get('/n-plus-one/').status_code, 200)
+
+    @override_settings(ROOT_URLCONF='store.tests')
+    async def test_middleware_checks_async_requests(self):
+        with self.assertRaisesMessage(NPlusOneError, 'via AuthorWithCountSerializer.get_total_books'):
+            await self.async_client.get('/async/n-plus-one/')
+
+
+class ReviewSummaryTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        author = Author.objects.create(title='Author', bio='Bio')
+        genre = Genre.objects.create(title='Fiction')
+        cls.book = Book.objects.create(title='Book', description='D', stock=1, price='4.00', author=author, genre=genre)
+        cls.users = [User.objects.create_user(username=f'critic{i}', password='x') for i in range(5)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/store/books/{self.book.id}/review/'
+
+    def histogram(self):
+        response, _ = self.assertMaxQueries(1, self.client.get, f'{self.url}summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_histogram_follows_create_update_and_delete(self):
+        self.assertEqual(self.histogram()['histogram'], {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0})
+        for user, score in zip(self.users, (5, 5, 4, 2, 5)):
+            Review.objects.create(user=user, book=self.book, score=score, description='R')
+        self.client.post(self.url, {'score': 1, 'description': 'Meh'})
+        self.client.post(self.url, {'score': 3, 'description': 'Changed my mind'})
+        review = Review.objects.get(user=self.users[0])
+        review.score = 4
+        review.save()
+        Review.objects.get(user=self.users[3]).delete()
+
+        summary = self.histogram()
+        self.assertEqual(summary['histogram'], {'1': 0, '2': 0, '3': 1, '4': 2, '5': 2})
+        self.assertEqual(summary['total_reviews'], 5)
+        self.assertEqual(summary['average_rating'], 4.2)
+        rebuilt = BookRatingHistogram.objects.get(book=self.book).as_dict()
+        BookRatingHistogram.objects.rebuild(Book.objects.filter(pk=self.book.pk))
+        self.assertEqual(BookRatingHistogram.objects.get(book=self.book).as_dict(), rebuilt)
+
+    def test_first_review_creates_the_row_without_reading_reviews(self):
+        with CaptureQueriesContext(connection) as ctx:
+            BookRatingHistogram.objects.adjust(self.book.id, 4, 1)
+        self.assertFalse(any('store_review' in q['sql'] for q in ctx.captured_queries))
+        BookRatingHistogram.objects.adjust(self.book.id, 4, 1)
+        self.assertEqual(BookRatingHistogram.objects.get(book=self.book).stars_4, 2)
+
+    def test_deleting_a_reviewed_book_leaves_no_histogram(self):
+        Review.objects.create(user=self.users[0], book=self.book, score=3, description='R')
+        Book.objects.filter(pk=self.book.pk).delete()
+        self.assertFalse(BookRatingHistogram.objects.exists())
+
+    def test_histogram_rolls_back_with_the_review(self):
+        Review.objects.create(user=self.users[0], book=self.book, score=5, description='R')
+        with mock.patch.object(BookRatingHistogram.objects, 'adjust', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Review.objects.create(user=self.users[1], book=self.book, score=5, description='R')
+        self.assertEqual(Review.objects.count(), 1)
+        self.assertEqual(self.histogram()['histogram']['5'], 1)
+
+    def test_reviews_are_newest_first_keyset_pages_with_user_names(self):
+        for user in self.users:
+            Review.objects.create(user=user, book=self.book, score=3, description='R')
+        seen, url = [], f'{self.url}?page_size=2'
+        while url:
+            data, _ = self.assertMaxQueries(1, self.client.get, url)
+            data = data.json()
+            seen.extend(row['user_name'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [user.username for user in reversed(self.users)])
+
+    def test_unknown_book(self):
+        self.assertEqual(self.client.get('/store/books/999999/review/summary/').status_code, 404)
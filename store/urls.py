@@ -1,5 +1,8 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
+from . import async_views
+from .metrics import MetricsView
 from .views import AuthorViewSet, GenreViewSet, BookViewSet, ReviewViewSet, CustomerViewSet, CartViewSet, CartItemViewSet
 
 router = DefaultRouter()
@@ -19,4 +22,15 @@ review_router.register('review', ReviewViewSet ,basename='book-review')
 carts_router = NestedDefaultRouter(router, 'carts', lookup='cart')
 carts_router.register('items', CartItemViewSet, basename='cart-items')
 
-urlpatterns = router.urls + review_router.urls + carts_router.urls
\ No newline at end of file
+# Native async read path, for deployments behind ASGI (core/asgi.py)
+async_urlpatterns = [
+    path('async/books/', async_views.book_list, name='async-book-list'),
+    path('async/books/<int:pk>/', async_views.book_detail, name='async-book-detail'),
+    path('async/genres/', async_views.genre_list, name='async-genre-list'),
+    path('async/authors/<int:pk>/', async_views.author_detail, name='async-author-detail'),
+    path('async/carts/<uuid:pk>/', async_views.cart_detail, name='async-cart-detail'),
+]
+
+urlpatterns = router.urls + review_router.urls + carts_router.urls + async_urlpatterns + [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
\ No newline at end of file
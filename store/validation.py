@@ -1,24 +1,84 @@
+import os
+from collections import namedtuple
 from django.core.exceptions import ValidationError
 from PIL import Image
 
+# Uploads are resized into derivatives by store/images.py, so only reject
+# images that are too small to be useful or too large to process.
+MIN_IMAGE_SIDE = 200  # pixels
+MAX_IMAGE_SIDE = 6000  # pixels
+MAX_IMAGE_PIXELS = MAX_IMAGE_SIDE * MAX_IMAGE_SIDE  # decompression bomb guard
+MAX_IMAGE_SIZE_KB = 2048  # 2MB (in KB)
+ALLOWED_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
 
-def validate_cover_image_size(image):
-    max_width = 400  # Max width in pixels
-    max_height = 600  # Max height in pixels
+ImageHeader = namedtuple('ImageHeader', ['format', 'width', 'height'])
 
-    img = Image.open(image)
-    if img.width != max_width or img.height != max_height:
-        raise ValidationError(f"Image size must be at most {max_width}x{max_height} pixels.")
-    
-def validate_image_file_size(image):
-    max_size_kb = 2048  # 2MB (in KB)
+
+def read_image_header(image):
+    """
+    Return the format and dimensions of an upload without decoding pixels.
+
+    Image.open only parses the header; the result is cached on the file
+    object so later checks on the same upload don't read it again.
+    """
+    header = getattr(image, '_image_header', None)
+    if header is not None:
+        return header
+
+    position = image.tell() if hasattr(image, 'tell') else None
+    try:
+        image.seek(0)
+        with Image.open(image) as img:
+            header = ImageHeader(img.format, img.width, img.height)
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise ValidationError("Upload a valid image. The file is either not an image or corrupted.")
+    finally:
+        if position is not None:
+            image.seek(position)
+
+    image._image_header = header
+    return header
+
+
+def validate_image_extension(image):
+    """The filename must carry an extension Pillow maps to one of ALLOWED_IMAGE_FORMATS."""
+    extension = os.path.splitext(image.name or '')[1].lower()
+    if Image.registered_extensions().get(extension) not in ALLOWED_IMAGE_FORMATS:
+        raise ValidationError(f"File extension \"{extension.lstrip('.')}\" is not allowed.")
+
+
+def validate_image_upload(image, min_side=MIN_IMAGE_SIDE, max_side=MAX_IMAGE_SIDE, max_size_kb=MAX_IMAGE_SIZE_KB):
+    """Single validation pass: byte size and extension, then header format, pixel count and dimensions."""
     if image.size > max_size_kb * 1024:
         raise ValidationError(f"Image file size cannot exceed {max_size_kb}KB.")
+    validate_image_extension(image)
+
+    header = read_image_header(image)
+    if header.format not in ALLOWED_IMAGE_FORMATS:
+        raise ValidationError(f"Unsupported image format. Use one of: {', '.join(ALLOWED_IMAGE_FORMATS)}.")
+    if header.width * header.height > MAX_IMAGE_PIXELS:
+        raise ValidationError(f"Image cannot exceed {MAX_IMAGE_PIXELS} pixels.")
+    if min(header.width, header.height) < min_side or max(header.width, header.height) > max_side:
+        raise ValidationError(f"Image sides must be between {min_side} and {max_side} pixels.")
+
+
+def validate_cover_image(image):
+    validate_image_upload(image)
+
+def validate_author_image(image):
+    validate_image_upload(image)
+
+def validate_review_image(image):
+    validate_image_upload(image, min_side=1)
+
+
+# Referenced by migrations 0001-0003; the fields now use the single-pass validators above.
+def validate_cover_image_size(image):
+    validate_cover_image(image)
+    
+def validate_image_file_size(image):
+    if image.size > MAX_IMAGE_SIZE_KB * 1024:
+        raise ValidationError(f"Image file size cannot exceed {MAX_IMAGE_SIZE_KB}KB.")
     
 def validate_author_image_size(image):
-    max_width = 400  # Max width in pixels
-    max_height = 400  # Max height in pixels
-
-    img = Image.open(image)
-    if img.width != max_width or img.height != max_height:
-        raise ValidationError(f"Image size must be at most {max_width}x{max_height} pixels.")
\ No newline at end of file
+    validate_author_image(image)
@@ -1,4 +1,7 @@
+import io
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from rest_framework.generics import get_object_or_404
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework import permissions
@@ -6,34 +9,112 @@ from rest_framework.response import Response
 from rest_framework.mixins import *
 from rest_framework.viewsets import GenericViewSet
 from rest_framework import status
-from .models import Genre, Author, Book, Customer, Order,  Review, Cart, CartItem
-from .serializers import GenraSerializer, AuthorSerializer, BookSerializer, ReviewSerializer, CustomerSerializer, CartSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CartItemSerializer
+from rest_framework.parsers import MultiPartParser
+from .models import Genre, Author, Book, BookRatingHistogram, Customer, Order,  Review, Cart, CartItem
+from .cache import VersionedCacheMixin
+from .catalog import FORMATS as CATALOG_FORMATS, CatalogFileError, export_catalog, guess_format, import_catalog, read_records
+from .search import search_books
+from .streaming import StreamingListMixin
+from .filters import BookFilter, IndexedOrderingFilter
+from .pagination import CreatedAtCursorPagination, IdCursorPagination
+from .serializers import GenraSerializer, AuthorSerializer, BookSerializer, ReviewSerializer, CustomerSerializer, CartSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CartItemSerializer, BatchCartItemSerializer, CartSummarySerializer, CheckoutSerializer, OrderSerializer
 
 # Create your views here.
-class GenreViewSet(ModelViewSet):
+class GenreViewSet(StreamingListMixin, VersionedCacheMixin, ModelViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenraSerializer
+    pagination_class = CreatedAtCursorPagination
+    cache_models = ('genre', 'book')
     permission_classes =[permissions.IsAdminUser]
 
-class AuthorViewSet(ModelViewSet):
+class AuthorViewSet(StreamingListMixin, VersionedCacheMixin, ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    pagination_class = CreatedAtCursorPagination
+    cache_models = ('author', 'book')
     permission_classes =[permissions.IsAdminUser]
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all()
+class BookViewSet(StreamingListMixin, VersionedCacheMixin, ModelViewSet):
+    # Ratings are denormalized onto Book, so author/genre are the only joins needed
+    queryset = Book.objects.select_related('author', 'genre').all()
     serializer_class = BookSerializer
+    pagination_class = CreatedAtCursorPagination
+    cache_models = ('book', 'author', 'genre')
+    # Only index-backed filters and orderings (see store/filters.py)
+    filter_backends = [BookFilter, IndexedOrderingFilter]
+    ordering_fields = ['created_at', 'price', 'average_rating']
+    ordering = ['-created_at', '-id']
 
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        return self.cached_response(request, self.search_results)
 
-class ReviewViewSet(ModelViewSet):
+    def search_results(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "The 'q' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        serializer = self.get_serializer(search_books(query, limit), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['POST'], url_path='import', parser_classes=[MultiPartParser],
+            permission_classes=[permissions.IsAdminUser])
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the catalog as the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        # Not ?format=, which DRF reserves for choosing the renderer
+        fmt = request.data.get('type') or guess_format(upload.name)
+        if fmt not in CATALOG_FORMATS:
+            return Response({"error": f"type must be one of {', '.join(CATALOG_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_catalog(read_records(stream, fmt))
+        except CatalogFileError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())
+
+    @action(detail=False, methods=['GET'], url_path='export', permission_classes=[permissions.IsAdminUser])
+    def bulk_export(self, request):
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in CATALOG_FORMATS:
+            return Response({"error": f"type must be one of {', '.join(CATALOG_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_catalog(fmt), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+        return response
+
+
+class ReviewViewSet(StreamingListMixin, ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ReviewSerializer
+    # Newest first over the (book, created_at) index
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         book_id=self.kwargs.get('book_pk')
         if book_id is None:
             return Review.objects.none()
-        return Review.objects.filter(book_id=book_id)
+        return Review.objects.filter(book_id=book_id).select_related('user')
+
+    @action(detail=False, methods=['GET'])
+    def summary(self, request, book_pk=None):
+        book = get_object_or_404(
+            Book.objects.select_related('rating_histogram').only(
+                'id', 'average_rating', 'rating_count', *(f'rating_histogram__{b}' for b in BookRatingHistogram.BUCKETS)
+            ),
+            pk=book_pk
+        )
+        histogram = getattr(book, 'rating_histogram', None) or BookRatingHistogram(book=book)
+        return Response({
+            'book': book.id,
+            'average_rating': float(book.average_rating),
+            'total_reviews': book.rating_count,
+            'histogram': histogram.as_dict(),
+        })
 
     def get_serializer_context(self):
         book_id = self.kwargs.get('book_pk')
@@ -41,17 +122,19 @@ class ReviewViewSet(ModelViewSet):
             return {}  # Return an empty context for schema generation
         return {'book_id': book_id, 'request': self.request}
     
-class CustomerViewSet(ModelViewSet):
+class CustomerViewSet(StreamingListMixin, ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = IdCursorPagination
 
     @action(detail=False, methods=['GET', 'PUT'], permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
         if request.user.is_staff:  # Exclude admin users
             return Response({"error": "Admins are not customers."}, status=status.HTTP_403_FORBIDDEN)
 
-        customer = Customer.objects.filter(user_id=request.user.id).first()
+        # Joined onto the cached user by CachedJWTAuthentication
+        customer = getattr(request.user, 'customer', None)
         if not customer:
             return Response({"error": "Customer does not exist."}, status=status.HTTP_404_NOT_FOUND)
         
@@ -65,13 +148,57 @@ class CustomerViewSet(ModelViewSet):
             return Response(serializer.data)
 
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__book').all()
+    queryset = Cart.objects.with_totals()
     serializer_class = CartSerializer
 
+    @action(detail=True, methods=['POST'], permission_classes=[permissions.IsAuthenticated])
+    def checkout(self, request, pk=None):
+        get_object_or_404(Cart, pk=pk)
+        customer = getattr(request.user, 'customer', None)
+        if not customer:
+            return Response({"error": "Customer does not exist."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = CheckoutSerializer(data=request.data, context={'cart_id': pk, 'customer': customer})
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['GET'])
+    def summary(self, request, pk=None):
+        cart = get_object_or_404(Cart.objects.with_summary(), pk=pk)
+        return Response(CartSummarySerializer(cart).data)
+
 class CartItemViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
 
+    @action(detail=False, methods=['POST'])
+    def batch(self, request, cart_pk=None):
+        get_object_or_404(Cart, pk=cart_pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = serializer.save()
+        self.touch_cart()
+        return Response(CartSerializer(cart).data)
+
+    # Every item write bumps Cart.last_activity so reap_abandoned_carts keeps the cart
+    def touch_cart(self):
+        Cart.objects.filter(pk=self.kwargs['cart_pk']).touch()
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.touch_cart()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.touch_cart()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.touch_cart()
+
     def get_serializer_class(self):
+        if self.action == 'batch':
+            return BatchCartItemSerializer
         if self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
@@ -79,7 +206,11 @@ class CartItemViewSet(ModelViewSet):
         return CartItemSerializer
 
     def get_serializer_context(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return {}  # Return an empty context for schema generation
         return {'cart_id': self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('book')
+        if getattr(self, 'swagger_fake_view', False):
+            return CartItem.objects.none()
+        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('book').with_total_price()